@@ -0,0 +1,203 @@
+"""
+基于规则的自动回复。
+每条规则包括适用的聊天、触发的关键词或正则表达式以及回复模板。规则按添加顺序确定优先级，先添加的优先。
+所有规则的关键词合并成一个 Aho-Corasick 自动机，无论有多少个关键词，每条消息都只需要扫描一遍。
+正则表达式按规则分别编译，只检查优先级高于已触发的关键词规则的那些，按优先级依次 search。
+关键词不区分大小写；正则表达式按原样编译，需要不区分大小写时在表达式中使用 (?i)。
+
+回复模板中可以使用以下占位符：
+    {chat}     聊天名称
+    {message}  收到的消息
+    {keyword}  触发规则的关键词或正则表达式匹配到的内容
+    {time}     当前时间（时:分）
+其他名称的占位符原样保留；花括号本身写作 {{ 和 }}。模板格式错误（如单独的花括号、{0} 这样的位置参数）时添加规则会抛出 ValueError。
+
+同一个聊天在 cooldown 秒内只回复一次，因此连续收到的一串消息只会回复一次；
+同一个聊天中 dedup_window 秒内重复出现的相同消息也不会再次回复。
+"""
+import re
+import time
+import collections
+
+
+class AhoCorasick:
+    """多关键词匹配自动机，一次扫描即可找出文本中出现的所有关键词"""
+    def __init__(self):
+        # 每个状态的转移、失败指针以及在该状态结束的 (关键词, 值) 列表
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self._built = True
+
+    def add(self, word, value):
+        state = 0
+        for char in word:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append((word, value))
+        self._built = False
+
+    def build(self):
+        # 按广度优先的顺序计算失败指针，并合并失败链上的输出
+        queue = collections.deque(self.goto[0].values())
+        for state in queue:
+            self.fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and char not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(char, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+        self._built = True
+
+    def search(self, text):
+        """
+        Return:
+            生成器，依次产生文本中出现的 (关键词, 值)
+        """
+        if not self._built:
+            self.build()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            yield from self.output[state]
+
+
+class ReplyRule:
+    def __init__(self, reply, keywords=(), regex=None, chats=None, name=""):
+        """
+        Args:
+            reply: 回复模板，见模块说明
+            keywords: 触发的关键词列表（不区分大小写），消息中包含任意一个即触发
+            regex: 触发的正则表达式，消息中能匹配（re.search）即触发
+            chats: 适用的聊天名称列表，为空时适用于所有聊天
+            name: 规则的名称，便于查看
+        说明：
+            keywords 和 regex 都为空时，规则对适用聊天中的任何消息都会触发；回复模板格式错误时抛出 ValueError
+        """
+        # 添加规则时就检查模板，而不是等到收到消息时才出错
+        try:
+            reply.format_map(_Placeholders(chat="", message="", keyword="", time=""))
+        except (ValueError, KeyError, IndexError, AttributeError, TypeError) as e:
+            raise ValueError(f"回复模板格式错误: {reply!r}（花括号本身请写作 {{{{ 和 }}}}）") from e
+        self.reply = reply
+        self.keywords = [k.lower() for k in keywords if k]
+        self.regex = regex
+        self.pattern = re.compile(regex) if regex is not None else None
+        self.chats = set(chats) if chats else None
+        self.name = name
+
+    def __repr__(self):
+        return f"ReplyRule({self.name or self.reply!r})"
+
+
+class _Placeholders(dict):
+    # 模板中未知的占位符原样保留
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+class AutoReplyEngine:
+    def __init__(self, cooldown=60.0, dedup_window=600.0, clock=time.time):
+        """
+        Args:
+            cooldown: 同一个聊天两次自动回复之间的最短间隔（秒）
+            dedup_window: 同一个聊天中相同的消息在多长时间内不重复回复（秒）
+            clock: 返回当前时间戳的函数
+        """
+        self.cooldown = cooldown
+        self.dedup_window = dedup_window
+        self.clock = clock
+        self.rules = []
+        self._matcher = AhoCorasick()
+        # 有正则表达式的规则下标，以及没有关键词和正则表达式、对任何消息都会触发的规则下标
+        self._regex_rules = []
+        self._catch_all = []
+        # 每个聊天上一次自动回复的时间，以及最近处理过的 (聊天, 消息) -> 时间
+        self.last_reply = {}
+        self.recent = collections.OrderedDict()
+
+    def add_rule(self, reply, keywords=(), regex=None, chats=None, name=""):
+        """添加一条规则，参数见 ReplyRule。返回创建的规则"""
+        rule = ReplyRule(reply, keywords, regex, chats, name)
+        index = len(self.rules)
+        self.rules.append(rule)
+        for keyword in rule.keywords:
+            self._matcher.add(keyword, index)
+        if regex is not None:
+            self._regex_rules.append(index)
+        if not rule.keywords and regex is None:
+            self._catch_all.append(index)
+        return rule
+
+    def match(self, chat, message):
+        """
+        查找消息触发的优先级最高的规则
+        Return:
+            (规则, 触发的内容)，没有触发时返回 (None, None)
+        """
+        # 规则下标 -> 触发的关键词，只保留每条规则第一次触发的关键词
+        hits = {}
+        for keyword, index in self._matcher.search(message.lower()):
+            hits.setdefault(index, keyword)
+
+        # 只检查关键词触发了的规则、有正则表达式的规则以及对任何消息都触发的规则，按优先级从高到低
+        for index in sorted(hits.keys() | set(self._regex_rules) | set(self._catch_all)):
+            rule = self.rules[index]
+            if rule.chats is not None and chat not in rule.chats:
+                continue
+            if index in hits:
+                return rule, hits[index]
+            if rule.pattern is not None:
+                match = rule.pattern.search(message)
+                if match is not None:
+                    return rule, match.group()
+            elif not rule.keywords:
+                return rule, ""
+        return None, None
+
+    def evaluate(self, chat, message):
+        """
+        计算收到一条消息后的自动回复，并记录回复时间
+        Args:
+            chat: 聊天名称
+            message: 收到的消息
+        Return:
+            (触发的规则, 回复的文本)。没有触发规则时返回 (None, None)；
+            触发了规则但处于冷却时间或为重复消息时返回 (规则, None)，调用方不应再使用其他方式回复
+        """
+        now = self.clock()
+        # 清理过期的去重记录
+        while self.recent and next(iter(self.recent.values())) < now - self.dedup_window:
+            self.recent.popitem(last=False)
+        rule, keyword = self.match(chat, message)
+        if rule is None:
+            return None, None
+
+        key = (chat, message)
+        if key in self.recent:
+            return rule, None
+        self.recent[key] = now
+        if now - self.last_reply.get(chat, float("-inf")) < self.cooldown:
+            return rule, None
+
+        self.last_reply[chat] = now
+        return rule, rule.reply.format_map(_Placeholders(
+            chat=chat, message=message, keyword=keyword, time=time.strftime("%H:%M", time.localtime(now))))
+
+    def reply_for(self, chat, message):
+        """
+        计算收到一条消息后的自动回复，见 evaluate
+        Return:
+            回复的文本，不需要回复（没有触发规则、处于冷却时间或重复消息）时返回None
+        """
+        return self.evaluate(chat, message)[1]
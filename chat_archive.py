@@ -0,0 +1,165 @@
+"""
+聊天记录的本地归档。
+把选定聊天的聊天记录持续追加到 SQLite 数据库中，每条消息一行：聊天、发送人、类型、内容、所在的时间分块以及指纹。
+指纹由消息在聊天中的位置（时间分块、分块内的位置）和内容计算，重叠的两次读取中相同的消息指纹相同，只会保存一次。
+每个聊天还保存上一次读到的最后一条消息（即 WeChat.get_new_dialogs 的游标），下一次只读取其后的新消息，
+已经归档的消息不会重新读取。
+
+写入先放在缓冲区中，攒够 batch_size 行后在一个事务中写入；游标与消息在同一个事务中更新，
+因此程序中途退出时游标不会越过尚未写入的消息。读取归档时逐行产生，不会把整个数据库读入内存。
+"""
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat TEXT NOT NULL,
+    sender TEXT,
+    type TEXT NOT NULL,
+    content TEXT,
+    block TEXT,
+    position INTEGER,
+    fingerprint BLOB NOT NULL UNIQUE,
+    archived_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_chat ON messages (chat, id);
+CREATE TABLE IF NOT EXISTS cursors (
+    chat TEXT PRIMARY KEY,
+    cursor TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def fingerprint(chat, key):
+    """
+    计算消息的指纹
+    Args:
+        chat: 聊天名称
+        key: 消息在聊天中的标识 (时间分块, 分块内的位置, 类型, 发送人, 内容)，见 WeChat._fingerprint_block
+    Return:
+        16 字节的摘要
+    """
+    text = "\x1f".join(str(part) for part in (chat, *key))
+    return hashlib.sha1(text.encode("utf-8")).digest()[:16]
+
+
+class ChatArchive:
+    def __init__(self, path="chats.db", batch_size=500):
+        """
+        Args:
+            path: 数据库文件路径
+            batch_size: 缓冲区中攒够多少行写入一次
+        """
+        self.path = path
+        self.batch_size = batch_size
+        # 尚未写入的 (聊天, 标识, (类型, 发送人, 内容), 归档时间)，以及尚未写入的游标
+        self._pending = []
+        self._cursors = {}
+        # 写入使用一个长期打开的连接，避免每批写入都重新打开数据库
+        self._writer = None
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def add(self, chat, entries, now=None):
+        """
+        追加一个聊天中新读到的消息，缓冲区满时自动写入
+        Args:
+            chat: 聊天名称
+            entries: (标识, (类型, 发送人, 内容)) 列表，按时间顺序排列，如 WeChat.get_new_dialog_entries 的返回值
+            now: 归档的时间戳，为空时使用当前时间
+        Return:
+            本次写入数据库的新消息数量（没有触发写入时为0）
+        """
+        if not entries:
+            return 0
+        now = time.time() if now is None else now
+        self._pending.extend((chat, key, dialog, now) for key, dialog in entries)
+        self._cursors[chat] = entries[-1][0]
+        if len(self._pending) >= self.batch_size:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """
+        写入缓冲区中的全部消息和游标
+        Return:
+            新写入的消息数量，重复的消息不计入
+        """
+        if not self._pending and not self._cursors:
+            return 0
+        rows = [(chat, sender, kind, content, key[0], key[1], fingerprint(chat, key), now)
+                for chat, key, (kind, sender, content), now in self._pending]
+        if self._writer is None:
+            self._writer = self._connect()
+            # 以追加写入为主，使用 WAL 日志减少每批提交的磁盘同步
+            self._writer.execute("PRAGMA journal_mode=WAL")
+            self._writer.execute("PRAGMA synchronous=NORMAL")
+        conn = self._writer
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO messages (chat, sender, type, content, block, position, "
+                         "fingerprint, archived_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        inserted = conn.total_changes - before
+        conn.executemany("INSERT OR REPLACE INTO cursors VALUES (?, ?, ?)",
+                         [(chat, json.dumps(key, ensure_ascii=False), time.time())
+                          for chat, key in self._cursors.items()])
+        conn.commit()
+        self._pending = []
+        self._cursors = {}
+        return inserted
+
+    def cursor(self, chat):
+        """
+        上一次归档到的位置
+        Return:
+            该聊天最后一条已归档消息的标识，从未归档过时返回None
+        """
+        if chat in self._cursors:
+            return self._cursors[chat]
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT cursor FROM cursors WHERE chat = ?", (chat,)).fetchone()
+        return tuple(json.loads(row[0])) if row else None
+
+    def count(self, chat=None):
+        """已归档的消息数量，chat 为空时统计所有聊天"""
+        with closing(self._connect()) as conn:
+            if chat is None:
+                return conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM messages WHERE chat = ?", (chat,)).fetchone()[0]
+
+    def messages(self, chat=None, after_id=0):
+        """
+        按归档顺序逐行读取消息
+        Args:
+            chat: 只读取该聊天的消息，为空时读取所有聊天
+            after_id: 只读取编号大于该值的消息，用于增量处理
+        Return:
+            生成器，依次产生 (编号, 聊天, 发送人, 类型, 内容, 时间分块, 归档时间)
+        """
+        sql = "SELECT id, chat, sender, type, content, block, archived_at FROM messages WHERE id > ?"
+        params = [after_id]
+        if chat is not None:
+            sql += " AND chat = ?"
+            params.append(chat)
+        with closing(self._connect()) as conn:
+            yield from conn.execute(sql + " ORDER BY id", params)
+
+    def close(self):
+        """写入缓冲区中的消息并关闭数据库连接"""
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
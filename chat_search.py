@@ -0,0 +1,261 @@
+"""
+聊天记录归档的全文检索。
+倒排索引保存在归档数据库（chat_archive.ChatArchive）中，中文（包括日文假名、韩文）按相邻两个字切分，
+英文和数字按单词切分（不区分大小写）。每个连续的中文片段的最后一个字单独作为一个词，这样只有一个字的查询
+也可以通过前缀范围查找到包含该字的所有消息。只有单字的查询不计算相关度，按时间从新到旧返回：
+包含该字的消息不多时从倒排索引中查找，很多时直接从最新的消息开始检查内容，凑够数量即停止，不会扫描整个归档。
+
+索引是增量建立的：update() 只处理上一次更新之后新归档的消息。查询时所有词都必须出现，
+先从出现次数最少的词开始逐条匹配，再按 BM25 计算相关度排序，相关度相同时较新的消息优先。
+中文按两个字切分会把不相邻的两个词误认为匹配，因此最后还会检查查询中的中文片段是否原样出现在消息中。
+
+查询语法：
+    会议 周五        同时包含“会议”和“周五”（空格分隔的多个词都必须出现）
+    report 下午      中英文可以混合
+"""
+import re
+import math
+import datetime
+import sqlite3
+import collections
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_postings (
+    token TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (token, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS search_terms (
+    token TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS search_docs (
+    id INTEGER PRIMARY KEY,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+# 中日韩文字，以及英文、数字和带重音的拉丁字母
+TOKEN_PATTERN = re.compile(r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+)|"
+                           r"([0-9a-z\u00c0-\u024f]+)")
+# 前缀查找的上界
+MAX_CHAR = "\U0010ffff"
+# 时间分块换算成绝对时间后的格式（见 WeChat._fingerprint_block），无法换算的时间分块保存的是原始文本或为空
+BLOCK_FORMAT = "%Y-%m-%d %H:%M"
+BLOCK_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]"
+
+
+def tokenize(text):
+    """
+    切分消息文本
+    Return:
+        词列表，中文为相邻两个字以及每个片段的最后一个字，英文为小写的单词
+    """
+    tokens = []
+    for cjk, word in TOKEN_PATTERN.findall(text.lower()):
+        if word:
+            tokens.append(word)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            tokens.append(cjk[-1])
+    return tokens
+
+
+def _block_key(value):
+    # 时间戳或 datetime 换算成与时间分块相同格式的文本，按分钟比较
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.fromtimestamp(value)
+    return value.strftime(BLOCK_FORMAT)
+
+
+def _parse_query(query):
+    """
+    Return:
+        (需要精确匹配的词, 需要前缀匹配的单字, 需要原样出现在消息中的中文片段)
+    """
+    exact, prefixes, phrases = [], [], []
+    for cjk, word in TOKEN_PATTERN.findall(query.lower()):
+        if word:
+            exact.append(word)
+        elif len(cjk) == 1:
+            prefixes.append(cjk)
+            phrases.append(cjk)
+        else:
+            exact.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            phrases.append(cjk)
+    return list(dict.fromkeys(exact)), list(dict.fromkeys(prefixes)), phrases
+
+
+class ChatSearchIndex:
+    # BM25 的参数
+    K1 = 1.2
+    B = 0.75
+    # 只有单字的查询中，包含该字的消息（按词的出现次数之和估计）不超过这个数量时从倒排索引中查找
+    PREFIX_CANDIDATES = 10000
+
+    def __init__(self, archive, batch_size=2000):
+        """
+        Args:
+            archive: 聊天记录归档（chat_archive.ChatArchive），索引保存在同一个数据库中
+            batch_size: 建立索引时每批处理的消息数量
+        """
+        self.archive = archive
+        self.batch_size = batch_size
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.archive.path)
+
+    @staticmethod
+    def _state(conn):
+        state = dict(conn.execute("SELECT key, value FROM search_state"))
+        return int(state.get("last_id", 0)), int(state.get("docs", 0)), state.get("length", 0)
+
+    def update(self):
+        """
+        为新归档的消息建立索引
+        Return:
+            本次建立索引的消息数量
+        """
+        # 先写入归档缓冲区中的消息
+        self.archive.flush()
+        total = 0
+        with closing(self._connect()) as conn:
+            last_id, docs, length = self._state(conn)
+            while True:
+                rows = conn.execute("SELECT id, content FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last_id, self.batch_size)).fetchall()
+                if not rows:
+                    break
+                postings = []
+                lengths = []
+                df = collections.Counter()
+                for msg_id, content in rows:
+                    tokens = tokenize(content or "")
+                    counts = collections.Counter(tokens)
+                    postings.extend((token, msg_id, tf) for token, tf in counts.items())
+                    lengths.append((msg_id, len(tokens)))
+                    df.update(counts.keys())
+                    length += len(tokens)
+                conn.executemany("INSERT OR IGNORE INTO search_postings VALUES (?, ?, ?)", postings)
+                conn.executemany("INSERT OR IGNORE INTO search_docs VALUES (?, ?)", lengths)
+                conn.executemany("INSERT INTO search_terms VALUES (?, ?) "
+                                 "ON CONFLICT (token) DO UPDATE SET df = df + excluded.df", df.items())
+                last_id = rows[-1][0]
+                docs += len(rows)
+                total += len(rows)
+                conn.executemany("INSERT OR REPLACE INTO search_state VALUES (?, ?)",
+                                 [("last_id", last_id), ("docs", docs), ("length", length)])
+                conn.commit()
+        return total
+
+    def search(self, query, chat=None, sender=None, msg_type=None, since=None, until=None, limit=20):
+        """
+        搜索聊天记录
+        Args:
+            query: 查询文本，见模块说明
+            chat: 只搜索该聊天
+            sender: 只搜索该发送人的消息
+            msg_type: 只搜索该类型的消息，如 "用户发送"（见 WeChat.DIALOG_TYPES）
+            since: 只搜索时间分块不早于该时间（时间戳或 datetime）的消息
+            until: 只搜索时间分块早于该时间的消息
+            limit: 最多返回的结果数量
+        Return:
+            按相关度从高到低排列的列表，元素为 (编号, 聊天, 发送人, 类型, 内容, 时间分块, 归档时间)
+        """
+        exact, prefixes, phrases = _parse_query(query)
+        if not exact and not prefixes:
+            return []
+
+        with closing(self._connect()) as conn:
+            last_id, docs, length = self._state(conn)
+            if docs == 0:
+                return []
+            avg_length = length / docs
+            df = {}
+            for token in exact:
+                row = conn.execute("SELECT df FROM search_terms WHERE token = ?", (token,)).fetchone()
+                if row is None:
+                    return []
+                df[token] = row[0]
+
+            # 第一步只用词频和消息长度计算相关度并排序：从出现次数最少的词开始，其余的词逐条按 (词, 编号) 查找
+            terms = []
+            joins = []
+            where = []
+            score_params, join_params, where_params = [], [], []
+            if exact:
+                exact.sort(key=df.get)
+                for i, token in enumerate(exact):
+                    # BM25: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * 长度 / 平均长度))
+                    idf = math.log(1 + (docs - df[token] + 0.5) / (df[token] + 0.5))
+                    terms.append(f"? * p{i}.tf / (p{i}.tf + ? + ? * d.length)")
+                    score_params += [idf * (self.K1 + 1), self.K1 * (1 - self.B), self.K1 * self.B / avg_length]
+                    if i == 0:
+                        where.append("p0.token = ?")
+                        where_params.append(token)
+                    else:
+                        joins.append(f"JOIN search_postings p{i} ON p{i}.token = ? AND p{i}.id = p0.id")
+                        join_params.append(token)
+                joins.append("JOIN search_docs d ON d.id = p0.id")
+            else:
+                # 只有单字时，查找以这个字开头的所有词。先估计包含每个字的消息数量，从最少的字开始查找
+                totals = {char: conn.execute("SELECT SUM(df) FROM search_terms WHERE token >= ? AND token < ?",
+                                             (char, char + MAX_CHAR)).fetchone()[0] for char in prefixes}
+                rarest = min(prefixes, key=lambda char: totals[char] or 0)
+                total = totals[rarest]
+                if not total:
+                    return []
+                if total <= self.PREFIX_CANDIDATES:
+                    where.append("p0.token >= ? AND p0.token < ?")
+                    where_params += [rarest, rarest + MAX_CHAR]
+            # 按消息所在时间分块的时间过滤，而不是归档时间：第一次归档一个聊天时，几个月的消息归档时间都相同。
+            # 时间分块无法换算成绝对时间的消息（如聊天最上方的消息）在按时间过滤时不会出现
+            filters = [(column, value) for column, value in
+                       (("m.chat = ?", chat), ("m.sender = ?", sender), ("m.type = ?", msg_type),
+                        ("m.block >= ?", since if since is None else _block_key(since)),
+                        ("m.block < ?", until if until is None else _block_key(until))) if value is not None]
+            if since is not None or until is not None:
+                filters.append(("m.block GLOB ?", BLOCK_GLOB))
+            if filters:
+                joins.append("JOIN messages m ON m.id = p0.id")
+                for column, value in filters:
+                    where.append(column)
+                    where_params.append(value)
+            if exact:
+                sql = (f"SELECT p0.id, MAX({' + '.join(terms)}) AS score FROM search_postings p0 {' '.join(joins)} "
+                       f"WHERE {' AND '.join(where)} GROUP BY p0.id ORDER BY score DESC, p0.id DESC")
+                ranked = conn.execute(sql, score_params + join_params + where_params)
+            elif total <= self.PREFIX_CANDIDATES:
+                # 只有单字且包含该字的消息不多：不计算相关度，较新的消息优先
+                sql = (f"SELECT DISTINCT p0.id, 0 FROM search_postings p0 {' '.join(joins)} "
+                       f"WHERE {' AND '.join(where)} ORDER BY p0.id DESC")
+                ranked = conn.execute(sql, join_params + where_params)
+            else:
+                # 只有单字且包含该字的消息很多：从最新的已建立索引的消息开始逐条检查内容，凑够 limit 条即停止
+                where = ["m.id <= ?"] + ["instr(m.content, ?)"] * len(prefixes) + [column for column, _ in filters]
+                ranked = conn.execute(f"SELECT m.id, 0 FROM messages m WHERE {' AND '.join(where)} ORDER BY m.id DESC",
+                                      [last_id] + prefixes + [value for _, value in filters])
+
+            # 第二步按相关度从高到低读取消息内容，检查中文片段是否原样出现，直到凑够 limit 条
+            results = []
+            step = max(limit, 1) * 2
+            while len(results) < limit:
+                ids = [msg_id for msg_id, _ in ranked.fetchmany(step)]
+                if not ids:
+                    break
+                rows = {row[0]: row for row in conn.execute(
+                    "SELECT id, chat, sender, type, content, block, archived_at FROM messages WHERE id IN "
+                    f"({', '.join('?' * len(ids))})", ids)}
+                for msg_id in ids:
+                    content = (rows[msg_id][4] or "").lower()
+                    if all(phrase in content for phrase in phrases):
+                        results.append(rows[msg_id])
+        return results[:limit]
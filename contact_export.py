@@ -0,0 +1,85 @@
+"""
+联系人、群聊的流式导出。
+扫描器每读到一行就立即写入文件，并每隔 flush_every 行刷新一次到磁盘。内存占用与好友数量无关，
+扫描中途出错或被取消时，已经读到的行也都保存在文件中。
+文件格式根据扩展名决定：
+    .csv    带表头的 CSV（utf_8_sig 编码，方便用 Excel 打开）
+    .jsonl  每行一个 JSON 对象
+    其他    每行只写第一列，如群聊列表的 .txt
+"""
+import csv
+import json
+
+
+class RowWriter:
+    def __init__(self, path, columns, flush_every=50):
+        """
+        Args:
+            path: 导出的文件路径
+            columns: 列名列表
+            flush_every: 每写入多少行刷新一次文件
+        """
+        self.columns = columns
+        self.flush_every = flush_every
+        self.count = 0
+
+        if path.lower().endswith(".csv"):
+            self.format = "csv"
+            self.file = open(path, "w", newline="", encoding="utf_8_sig")
+            self._csv = csv.writer(self.file)
+            self._csv.writerow(columns)
+        else:
+            self.format = "jsonl" if path.lower().endswith(".jsonl") else "txt"
+            self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, row):
+        """
+        写入一行
+        Args:
+            row: 与 columns 顺序一致的行数据，只有一列时也可以直接传入该列的值
+        """
+        if not isinstance(row, (tuple, list)):
+            row = (row,)
+
+        if self.format == "csv":
+            self._csv.writerow(row)
+        elif self.format == "jsonl":
+            self.file.write(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + "\n")
+        else:
+            self.file.write(f"{row[0]}\n")
+
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def export_rows(rows, path, columns, flush_every=50, progress=None, should_stop=None):
+    """
+    把扫描器产生的行逐行写入文件
+    Args:
+        rows: 行的可迭代对象，如 WeChat.iter_contacts()
+        path: 导出的文件路径
+        columns: 列名列表
+        flush_every: 每写入多少行刷新一次文件
+        progress: 每写入一行后调用 progress(已写入的行数)
+        should_stop: 无参数的函数，返回真值时停止导出
+    Return:
+        写入的行数
+    """
+    with RowWriter(path, columns, flush_every) as writer:
+        for row in rows:
+            writer.write(row)
+            if progress is not None:
+                progress(writer.count)
+            if should_stop is not None and should_stop():
+                break
+        return writer.count
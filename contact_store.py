@@ -0,0 +1,246 @@
+"""
+本地的好友、群聊目录。
+每次获取好友或群聊列表时，把读到的行同步到 SQLite 数据库中：
+    - 记录每个好友第一次和最后一次出现的时间
+    - 完整扫描结束后，本次没有出现的好友标记为已删除（不会真正删除记录），再次出现时恢复
+    - 每次同步的新增、变化、删除和恢复都记录在 changes 表中，可以随时查看上一次同步的差异
+
+快速同步（quick=True）在扫描过程中发现连续 match_run 行与数据库中的顺序和内容完全一致时立即停止扫描，
+适合变化集中在列表前部的情况（如按最近聊天排序的群聊列表）。快速同步提前停止时不会标记删除，需要定期进行完整同步。
+"""
+import time
+import sqlite3
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    note TEXT,
+    label TEXT,
+    position INTEGER,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    removed_at REAL,
+    PRIMARY KEY (kind, name)
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL,
+    quick INTEGER NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0,
+    scanned INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS changes (
+    sync_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    change TEXT NOT NULL,
+    note TEXT,
+    label TEXT,
+    old_note TEXT,
+    old_label TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_sync ON changes (sync_id);
+"""
+
+
+class SyncDiff:
+    def __init__(self, kind):
+        self.kind = kind
+        # 新增、恢复、删除的行为 (名称, 备注, 标签)；变化的行为 (旧的行, 新的行)
+        self.added = []
+        self.restored = []
+        self.removed = []
+        self.changed = []
+        # 本次扫描的行数，是否扫描到了列表末尾，是否因快速同步提前停止
+        self.scanned = 0
+        self.complete = False
+        self.stopped_early = False
+
+    def __bool__(self):
+        return bool(self.added or self.restored or self.removed or self.changed)
+
+    def __repr__(self):
+        return (f"SyncDiff({self.kind!r}, added={len(self.added)}, changed={len(self.changed)}, "
+                f"removed={len(self.removed)}, restored={len(self.restored)}, scanned={self.scanned})")
+
+
+class ContactStore:
+    # 每写入多少行提交一次，扫描中断时已读到的行也会保存
+    COMMIT_EVERY = 200
+
+    def __init__(self, path="contacts.db"):
+        """
+        Args:
+            path: 数据库文件路径
+        """
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # 每次操作单独连接，这样扫描可以在导出线程中进行
+        return sqlite3.connect(self.path)
+
+    @staticmethod
+    def _normalize(row):
+        # 群聊只有名称，统一成 (名称, 备注, 标签)
+        if isinstance(row, (tuple, list)):
+            name, note, label = (tuple(row) + (None, None))[:3]
+        else:
+            name, note, label = row, None, None
+        return name, note, label
+
+    def sync_iter(self, kind, rows, quick=False, match_run=20, now=None):
+        """
+        边扫描边同步。原样产生 rows 中的每一行，同时更新数据库
+        Args:
+            kind: 目录的种类，如 "contact" 或 "group"
+            rows: 扫描器产生的行，如 WeChat.iter_contacts()
+            quick: 是否快速同步
+            match_run: 快速同步时，连续多少行与数据库一致即停止扫描
+            now: 同步的时间戳，为空时使用当前时间
+        Return:
+            生成器。同步结果（SyncDiff）在生成器结束后保存在 self.last_result 中
+        """
+        now = time.time() if now is None else now
+        diff = SyncDiff(kind)
+        self.last_result = diff
+        conn = self._connect()
+        sync_id = None
+        try:
+            stored = {name: (note, label, removed_at) for name, note, label, removed_at in conn.execute(
+                "SELECT name, note, label, removed_at FROM contacts WHERE kind = ?", (kind,))}
+            # 未删除的行在上一次扫描中的顺序，用于快速同步判断是否与数据库一致
+            order = [name for name, in conn.execute(
+                "SELECT name FROM contacts WHERE kind = ? AND removed_at IS NULL ORDER BY position", (kind,))]
+            index = {name: i for i, name in enumerate(order)}
+            sync_id = conn.execute("INSERT INTO syncs (kind, started, quick) VALUES (?, ?, ?)",
+                                   (kind, now, int(quick))).lastrowid
+
+            seen = set()
+            run = 0
+            prev = None
+            for row in rows:
+                name, note, label = self._normalize(row)
+                if name in seen:
+                    yield row
+                    continue
+                seen.add(name)
+
+                old = stored.get(name)
+                unchanged = False
+                if old is None:
+                    diff.added.append((name, note, label))
+                    self._record(conn, sync_id, kind, "added", name, note, label)
+                    conn.execute("INSERT INTO contacts (kind, name, note, label, position, first_seen, last_seen) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?)", (kind, name, note, label, diff.scanned, now, now))
+                else:
+                    old_note, old_label, removed_at = old
+                    if removed_at is not None:
+                        diff.restored.append((name, note, label))
+                        self._record(conn, sync_id, kind, "restored", name, note, label)
+                    elif (old_note, old_label) != (note, label):
+                        diff.changed.append(((name, old_note, old_label), (name, note, label)))
+                        self._record(conn, sync_id, kind, "changed", name, note, label, old_note, old_label)
+                    else:
+                        unchanged = True
+                    conn.execute("UPDATE contacts SET note = ?, label = ?, position = ?, last_seen = ?, "
+                                 "removed_at = NULL WHERE kind = ? AND name = ?",
+                                 (note, label, diff.scanned, now, kind, name))
+
+                diff.scanned += 1
+                if diff.scanned % self.COMMIT_EVERY == 0:
+                    conn.commit()
+                yield row
+
+                # 与数据库中上一行紧接着的未变化行才计入连续一致的行数
+                i = index.get(name) if unchanged else None
+                if i is None:
+                    run = 0
+                elif prev is not None and i == prev + 1:
+                    run += 1
+                else:
+                    run = 1
+                prev = i
+                if quick and run >= match_run:
+                    diff.stopped_early = True
+                    break
+            else:
+                diff.complete = True
+
+            # 只有完整扫描到列表末尾时才能确定哪些行已经不存在
+            if diff.complete:
+                for name, (note, label, removed_at) in stored.items():
+                    if removed_at is None and name not in seen:
+                        diff.removed.append((name, note, label))
+                        self._record(conn, sync_id, kind, "removed", name, note, label)
+                        conn.execute("UPDATE contacts SET removed_at = ? WHERE kind = ? AND name = ?",
+                                     (now, kind, name))
+        finally:
+            # 扫描被中断时也保存已经读到的行
+            if sync_id is not None and (diff.scanned or diff.complete):
+                conn.execute("UPDATE syncs SET finished = ?, complete = ?, scanned = ? WHERE id = ?",
+                             (time.time(), int(diff.complete), diff.scanned, sync_id))
+            conn.commit()
+            conn.close()
+
+    def sync(self, kind, rows, quick=False, match_run=20, now=None):
+        """
+        同步全部行
+        Return:
+            SyncDiff
+        """
+        for _ in self.sync_iter(kind, rows, quick, match_run, now):
+            pass
+        return self.last_result
+
+    @staticmethod
+    def _record(conn, sync_id, kind, change, name, note, label, old_note=None, old_label=None):
+        conn.execute("INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     (sync_id, kind, name, change, note, label, old_note, old_label))
+
+    def last_diff(self, kind):
+        """
+        上一次同步的差异
+        Args:
+            kind: 目录的种类
+        Return:
+            SyncDiff，从未同步过时返回None
+        """
+        with closing(self._connect()) as conn:
+            last = conn.execute("SELECT id, quick, complete, scanned FROM syncs WHERE kind = ? AND finished IS NOT NULL "
+                                "ORDER BY id DESC LIMIT 1", (kind,)).fetchone()
+            if last is None:
+                return None
+            sync_id, quick, complete, scanned = last
+            diff = SyncDiff(kind)
+            diff.scanned = scanned
+            diff.complete = bool(complete)
+            diff.stopped_early = bool(quick) and not complete
+            for name, change, note, label, old_note, old_label in conn.execute(
+                    "SELECT name, change, note, label, old_note, old_label FROM changes WHERE sync_id = ?",
+                    (sync_id,)):
+                if change == "changed":
+                    diff.changed.append(((name, old_note, old_label), (name, note, label)))
+                else:
+                    getattr(diff, change).append((name, note, label))
+            return diff
+
+    def contacts(self, kind, include_removed=False):
+        """
+        读取目录中的行
+        Args:
+            kind: 目录的种类
+            include_removed: 是否包括已删除的行
+        Return:
+            列表，元素为 (名称, 备注, 标签, 第一次出现的时间, 最后一次出现的时间, 删除的时间)
+        """
+        sql = "SELECT name, note, label, first_seen, last_seen, removed_at FROM contacts WHERE kind = ?"
+        if not include_removed:
+            sql += " AND removed_at IS NULL"
+        with closing(self._connect()) as conn:
+            return conn.execute(sql + " ORDER BY position", (kind,)).fetchall()
@@ -0,0 +1,47 @@
+"""
+DataFrame 逐行添加数据的性能对比。
+_append 每次都会复制全部已有数据，总耗时随行数平方增长；append_row / append_values 原地添加，总耗时随行数线性增长。
+
+在项目根目录运行：python -m custom_libs.benchmark_pandas_utils
+"""
+import time
+
+from custom_libs.pandas_utils import DataFrame
+
+COLUMNS = ["昵称", "备注", "标签"]
+
+
+def bench_copy_append(n):
+    df = DataFrame(columns=COLUMNS)
+    for i in range(n):
+        df = df._append({"昵称": f"用户{i}", "备注": "", "标签": ""}, ignore_index=True)
+    return df
+
+
+def bench_append_row(n):
+    df = DataFrame(columns=COLUMNS)
+    for i in range(n):
+        df.append_row({"昵称": f"用户{i}", "备注": "", "标签": ""})
+    return df
+
+
+def bench_append_values(n):
+    df = DataFrame(columns=COLUMNS)
+    for i in range(n):
+        df.append_values((f"用户{i}", "", ""))
+    return df
+
+
+def timeit(func, n):
+    start = time.perf_counter()
+    df = func(n)
+    elapsed = time.perf_counter() - start
+    assert len(df) == n
+    return elapsed
+
+
+if __name__ == "__main__":
+    print(f"{'行数':>8} {'_append':>12} {'append_row':>12} {'append_values':>14}")
+    for n in (1000, 2000, 4000, 8000, 16000):
+        print(f"{n:>8} {timeit(bench_copy_append, n):>11.4f}s {timeit(bench_append_row, n):>11.4f}s "
+              f"{timeit(bench_append_values, n):>13.4f}s")
@@ -1,4 +1,6 @@
 class DataFrame:
+    __slots__ = ("columns", "data")
+
     def __init__(self, data=None, columns=None):
         """
         初始化 DataFrame
@@ -37,6 +39,31 @@ class DataFrame:
         
         return new_df
     
+    def append_row(self, row_dict):
+        """
+        原地添加一行数据，均摊时间复杂度为 O(1)。
+        与 _append 不同，该方法不会复制已有的数据，适合逐行收集大量数据
+        
+        Args:
+            row_dict: 包含行数据的字典
+        """
+        self.data.append(tuple(row_dict.get(col, None) for col in self.columns))
+    
+    def append_values(self, values):
+        """
+        原地添加一行按列顺序排列的数据，省去字典的构造和查找
+        
+        Args:
+            values: 与 columns 顺序一致的行数据
+        """
+        if len(values) != len(self.columns):
+            raise ValueError(f"行数据的长度 {len(values)} 与列数 {len(self.columns)} 不一致")
+        self.data.append(tuple(values))
+    
+    def __len__(self):
+        """返回行数"""
+        return len(self.data)
+    
     def drop_duplicates(self, subset=None):
         """
         删除重复行
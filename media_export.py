@@ -0,0 +1,192 @@
+"""
+聊天记录中图片、视频的导出。
+界面循环（右键、复制、读取剪切板中的文件路径）只负责收集源文件路径，复制文件由线程池完成：
+在进程内边复制边计算 SHA-256，不再为每个文件启动一个 shell。
+
+每个导出目录中有一个清单（SQLite 数据库），记录每个源文件的大小、修改时间、内容摘要以及导出后的文件名：
+    - 源文件已经导出过且没有变化时不再复制，重新运行时从上一次停止的地方继续
+    - 清单同时记录图片在聊天记录中的条目名称和序号，重新运行时同一位置、同一名称的条目在右键复制之前就跳过
+    - 不同路径但内容相同的文件只保存一份
+
+导出的文件名为 <序号><扩展名>（如 3.jpg）。聊天中有了新图片后重新运行，序号会整体后移，
+这时如果 <序号>.jpg 已经保存了之前运行导出的另一张图片，则新图片保存为 <序号>_<SHA-256 的前8位>.jpg，不会覆盖旧文件。
+"""
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    file TEXT NOT NULL,
+    exported_at REAL NOT NULL,
+    row TEXT,
+    position INTEGER
+);
+CREATE INDEX IF NOT EXISTS media_sha256 ON media (sha256);
+"""
+
+
+class MediaExporter:
+    # 复制时每次读取的字节数
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, save_dir, workers=4, manifest="manifest.db"):
+        """
+        Args:
+            save_dir: 保存的目录
+            workers: 复制文件的线程数量
+            manifest: 清单的文件名，保存在 save_dir 中
+        """
+        self.save_dir = save_dir
+        os.makedirs(save_dir, exist_ok=True)
+        # 清单由多个复制线程共同写入，使用一个连接并加锁
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(save_dir, manifest), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        # 旧版本的清单中没有条目名称和序号
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(media)")}
+        for column, kind in (("row", "TEXT"), ("position", "INTEGER")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE media ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS media_row ON media (row, position)")
+        self._conn.commit()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+        # 本次运行中已经提交过的源文件
+        self._seen = set()
+        # copied：新复制的文件，skipped：之前已经导出过，duplicates：与已导出的文件内容相同，failed：复制失败
+        self.stats = collections.Counter()
+        self.errors = []
+
+    def _exported(self, source):
+        # 源文件已经导出过、之后没有变化且导出的文件仍然存在
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime, file FROM media WHERE source = ?", (source,)).fetchone()
+        if row is None:
+            return False
+        size, mtime, file = row
+        try:
+            stat = os.stat(source)
+        except OSError:
+            # 源文件已经被清理，以之前导出的为准
+            return os.path.exists(os.path.join(self.save_dir, file))
+        return (stat.st_size, stat.st_mtime) == (size, mtime) and os.path.exists(os.path.join(self.save_dir, file))
+
+    def exported_row(self, row, order):
+        """
+        在界面上复制文件之前检查该条目是否已经导出过：之前的运行中同一序号导出了同名的条目，且导出的文件仍然存在
+        Args:
+            row: 条目在聊天记录列表中的名称，为空时无法判断
+            order: 条目的序号
+        Return:
+            是否已经导出过，是则直接跳过该条目
+        """
+        if not row:
+            return False
+        with self._lock:
+            found = self._conn.execute("SELECT source, file FROM media WHERE row = ? AND position = ?",
+                                       (row, order)).fetchone()
+        if found is None or found[0] in self._seen or not os.path.exists(os.path.join(self.save_dir, found[1])):
+            return False
+        # 滚动后再次遇到该条目并复制出同一个源文件时不会重复计数
+        self._seen.add(found[0])
+        self.stats["skipped"] += 1
+        return True
+
+    def submit(self, source, order, row=None):
+        """
+        提交一个源文件，立即返回，复制在线程池中进行
+        Args:
+            source: 源文件路径
+            order: 文件的序号，作为导出后的文件名（如 3.jpg）
+            row: 条目在聊天记录列表中的名称，记录在清单中供 exported_row 使用
+        Return:
+            本次运行中是否第一次提交该文件
+        """
+        if source in self._seen:
+            return False
+        self._seen.add(source)
+        if self._exported(source):
+            self.stats["skipped"] += 1
+            with self._lock:
+                self._conn.execute("UPDATE media SET row = ?, position = ? WHERE source = ?", (row, order, source))
+                self._conn.commit()
+        else:
+            self._futures.append(self._pool.submit(self._copy, source, order, row))
+        return True
+
+    def _copy(self, source, order, row):
+        suffix = os.path.splitext(source)[1]
+        stat = os.stat(source)
+        digest = hashlib.sha256()
+        # 先复制到临时文件，确认内容没有重复后再改成正式的文件名，中途退出不会留下不完整的文件
+        fd, temp = tempfile.mkstemp(suffix=".part", dir=self.save_dir)
+        try:
+            with open(source, "rb") as src, os.fdopen(fd, "wb") as dst:
+                while True:
+                    chunk = src.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    dst.write(chunk)
+            shutil.copystat(source, temp)
+            sha256 = digest.hexdigest()
+
+            with self._lock:
+                same = self._conn.execute("SELECT file FROM media WHERE sha256 = ?", (sha256,)).fetchone()
+                if same is not None and os.path.exists(os.path.join(self.save_dir, same[0])):
+                    # 内容相同的文件已经导出过
+                    os.remove(temp)
+                    file = same[0]
+                    self.stats["duplicates"] += 1
+                else:
+                    file = f"{order}{suffix}"
+                    if os.path.exists(os.path.join(self.save_dir, file)):
+                        # 之前的运行中同一个序号保存了别的文件
+                        file = f"{order}_{sha256[:8]}{suffix}"
+                    os.replace(temp, os.path.join(self.save_dir, file))
+                    self.stats["copied"] += 1
+                self._conn.execute("INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (source, stat.st_size, stat.st_mtime, sha256, file, time.time(), row, order))
+                self._conn.commit()
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        return file
+
+    def close(self):
+        """
+        等待所有文件复制完成并关闭清单
+        Return:
+            stats
+        """
+        try:
+            for future in self._futures:
+                try:
+                    future.result()
+                except OSError as e:
+                    self.stats["failed"] += 1
+                    self.errors.append(e)
+        finally:
+            # 出现其他异常时也关闭线程池和清单，未开始的复制直接取消
+            self._futures = []
+            self._pool.shutdown(cancel_futures=True)
+            self._conn.close()
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,4 +1,4 @@
-import time
+from rate_limiter import RateLimiter
 from PyQt6.QtCore import QThread, pyqtSignal
 from PyQt6.QtWidgets import QMessageBox
 
@@ -14,6 +14,7 @@ class MessageSenderThread(QThread):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.interval = 0  # 发送间隔时间（秒）
+        self.limiter = None  # 发送速率控制
         self.contacts_view = None  # 联系人列表
         self.msg = None  # 消息列表
         self.wechat = None  # 微信操作对象
@@ -26,14 +27,21 @@ class MessageSenderThread(QThread):
         # 是否停止发送
         self.is_stopped = False
     
-    def setup(self, wechat, contacts_view, msg, interval, start_index=None, end_index=None):
+    def setup(self, wechat, contacts_view, msg, interval, start_index=None, end_index=None,
+              per_minute=0, recipient_gap=0, jitter=0):
         """
         设置发送参数
+        Args:
+            interval: 相邻两条消息之间的最小间隔（秒，可以是小数），发送操作本身花费的时间会被扣除
+            per_minute: 每分钟最多发送的消息数量，0 表示不限制
+            recipient_gap: 发给同一个用户的相邻两条消息之间的最小间隔（秒）
+            jitter: 每次等待额外增加的随机时间的最大值（秒）
         """
         self.wechat = wechat
         self.contacts_view = contacts_view
         self.msg = msg
         self.interval = interval
+        self.limiter = RateLimiter(interval, per_minute, recipient_gap, jitter)
         
         # 如果未定义范围的开头和结尾，则默认发送全部信息
         if start_index is None:
@@ -77,32 +85,37 @@ class MessageSenderThread(QThread):
                     if self.is_stopped or self.hotkey_pressed:
                         break
                         
-                    # 等待间隔时间（在线程中等待不会阻塞GUI）
-                    if msg_i > self.start_index:  # 第一条消息不需要等待
-                        time.sleep(int(self.interval))
-                    
                     msg = self.msg.item(msg_i).text().replace("\\n", "\n")
                     
                     _, type, to, content = msg.split(':', 3)
                     # 判断是否需要发送给该用户
                     if to == "all" or str(rank) in to.split(','):
+                        # 按速率限制等待（在线程中等待不会阻塞GUI），等待期间停止发送则直接退出
+                        if not self.limiter.acquire(name, lambda: self.is_stopped or self.hotkey_pressed):
+                            break
+
+                        ok = False
                         # 判断为文本内容
                         if type == "text":
-                            self.wechat.send_msg(name, content, search_user)
+                            ok = self.wechat.send_msg(name, content, search_user)
                         
                         # 判断为文件内容
                         elif type == "file":
-                            self.wechat.send_file(name, content, search_user)
+                            ok = self.wechat.send_file(name, content, search_user)
                         
                         # 判断为@他人
                         elif type == "at":
-                            self.wechat.at(name, content, search_user)
+                            ok = self.wechat.at(name, content, search_user)
                     
-                        # 搜索用户只在第一次发送时进行
-                        search_user = False
+                        # 搜索用户只在第一次发送成功之前进行，找不到该用户时下一条消息重新搜索，不会发到其他聊天
+                        if ok:
+                            search_user = False
                     
                     # 发送消息后发出信号
                     self.message_sent.emit(msg_i)
+                
+                # 每个用户发送完成后，一次性校验延后校验的消息
+                self.wechat.verify_pending()
             
             # 发送完成后发出信号
             self.sending_finished.emit()
@@ -7,11 +7,16 @@ from PyQt6.QtWidgets import *
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from ui_auto_wechat import WeChat
+from scheduler import Scheduler, IntervalEntry
+from contact_export import export_rows
 from functools import partial
 
 
 # 定时发送子线程类
 class ClockThread(QThread):
+    # 等待期间最多每隔多少秒检查一次系统时间是否被调整
+    CLOCK_CHECK = 60
+
     def __init__(self):
         super().__init__()
         # 是否正在定时
@@ -19,39 +24,131 @@ class ClockThread(QThread):
         # 发送信息的函数
         self.send_func = None
         # 定时列表
-        self.clocks = None
+        self._clocks = None
         # 是否防止自动下线
         self.prevent_offline = False
         self.prevent_func = None
         # 每隔多少分钟进行一次防止自动下线操作
         self.prevent_count = 60
+        # 错过定时的处理方式，见 scheduler.Scheduler
+        self.scheduler = Scheduler(policy="late")
+        # 定时列表变化或停止定时时唤醒调度线程
+        self.cond = threading.Condition()
+        self._prevent_entry = None
 
     def __del__(self):
         self.wait()
 
+    @property
+    def clocks(self):
+        return self._clocks
+
+    @clocks.setter
+    def clocks(self, view):
+        # 定时列表发生变化时重新装载任务
+        self._clocks = view
+        model = view.model()
+        model.rowsInserted.connect(self.rearm)
+        model.rowsRemoved.connect(self.rearm)
+        model.dataChanged.connect(self.rearm)
+        model.modelReset.connect(self.rearm)
+
+    def rearm(self, *_):
+        """在GUI线程中读取定时列表，解析后交给调度线程"""
+        if not self.time_counting:
+            return
+        texts = [self._clocks.item(i).text() for i in range(self._clocks.count())]
+        with self.cond:
+            self.scheduler.load(texts, time.time(), [self._prevent_entry])
+            self.cond.notify()
+
+    def start(self, *args, **kwargs):
+        self._prevent_entry = IntervalEntry("prevent", self.prevent_count * 60, time.time())
+        self.time_counting = True
+        self.rearm()
+        super().start(*args, **kwargs)
+
+    def stop(self):
+        """停止定时并立即唤醒调度线程"""
+        with self.cond:
+            self.time_counting = False
+            self.cond.notify()
+
     def run(self):
-        cnt = 60
+        # 系统时间与 time.monotonic() 的差值，差值发生变化说明系统时间被调整了
+        offset = time.time() - time.monotonic()
         while self.time_counting:
-            localtime = time.localtime(time.time())
-            year = localtime.tm_year
-            month = localtime.tm_mon
-            day = localtime.tm_mday
-            hour = localtime.tm_hour % 24
-            min = localtime.tm_min % 60
-
-            for i in range(self.clocks.count()):
-                clock_year, clock_month, clock_day, clock_hour, clock_min, st_ed = self.clocks.item(i).text().split(" ")
-                st, ed = st_ed.split('-')
-                if (int(clock_hour) == hour and int(clock_min) == min and int(clock_year) == year and
-                        int(clock_month) == month and int(clock_day) == day):
-                    self.send_func(st=int(st), ed=int(ed))
-                    # self.send_func()
-                    
-            if self.prevent_offline and cnt % self.prevent_count == 0:
-                self.prevent_func()
-
-            time.sleep(60)
-            cnt += 1
+            with self.cond:
+                next_due = self.scheduler.next_due()
+                if next_due is None:
+                    self.cond.wait()
+                    continue
+
+                # 触发时间是系统时间（定时列表中的年月日时分），换算成 time.monotonic() 的截止时间后等待，
+                # 等待的时长不受系统时间调整的影响
+                now = time.monotonic()
+                current = time.time() - now
+                if abs(current - offset) > 1:
+                    # 系统时间被调整，按新的系统时间重新换算截止时间
+                    offset = current
+                deadline = next_due - offset
+                if deadline > now:
+                    # 等待期间系统时间也可能被调整，最多等待 CLOCK_CHECK 秒就重新换算一次
+                    self.cond.wait(min(deadline - now, self.CLOCK_CHECK))
+                    continue
+                due_entries = self.scheduler.pop_due(now + offset)
+
+            for entry, _ in due_entries:
+                if not self.time_counting:
+                    break
+                if entry.kind == "send":
+                    self.send_func(st=entry.st, ed=entry.ed)
+                elif entry.kind == "prevent" and self.prevent_offline:
+                    self.prevent_func()
+
+
+# 导出联系人、群聊的子线程类
+class ExportThread(QThread):
+    # 已导出的行数
+    progress = pyqtSignal(int)
+    # 导出结束，参数为导出的行数
+    finished_export = pyqtSignal(int)
+    # 导出被取消，参数为取消前已导出的行数
+    cancelled = pyqtSignal(int)
+    # 导出出错，参数为错误信息以及出错前已导出的行数
+    error = pyqtSignal(str, int)
+
+    def __init__(self, rows_func, path, columns):
+        """
+        Args:
+            rows_func: 返回行生成器的函数，如 wechat.iter_contacts
+            path: 导出的文件路径
+            columns: 列名列表
+        """
+        super().__init__()
+        self.rows_func = rows_func
+        self.path = path
+        self.columns = columns
+        self.count = 0
+        self.is_stopped = False
+
+    def stop(self):
+        self.is_stopped = True
+
+    def _on_progress(self, count):
+        self.count = count
+        self.progress.emit(count)
+
+    def run(self):
+        try:
+            count = export_rows(self.rows_func(), self.path, self.columns, progress=self._on_progress,
+                                should_stop=lambda: self.is_stopped)
+            if self.is_stopped:
+                self.cancelled.emit(count)
+            else:
+                self.finished_export.emit(count)
+        except Exception as e:
+            self.error.emit(str(e), self.count)
 
 
 class MyListWidget(QListWidget):
@@ -192,11 +289,12 @@ class FileDialog(QDialog):
 
 
 class MySpinBox(QWidget):
-    def __init__(self, desc: str, **kwargs):
+    def __init__(self, desc: str, decimals: int = 0, **kwargs):
         """
         附带标签的SpinBox
         Args:
             desc: 默认的标签
+            decimals: 小数位数，大于0时可以输入小数
         """
         super().__init__(**kwargs)
 
@@ -208,7 +306,12 @@ class MySpinBox(QWidget):
         # self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
         # 初始化计数器
-        self.spin_box = QSpinBox()
+        if decimals > 0:
+            self.spin_box = QDoubleSpinBox()
+            self.spin_box.setDecimals(decimals)
+            self.spin_box.setSingleStep(0.1)
+        else:
+            self.spin_box = QSpinBox()
         # self.spin_box.valueChanged.connect(self.valuechange)
 
         layout.addWidget(self.label)
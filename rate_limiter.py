@@ -0,0 +1,91 @@
+"""
+发送速率控制。
+支持以下几种限制，可以同时使用：
+    interval: 相邻两条消息之间的最小间隔（秒，可以是小数）。间隔从上一条消息开始发送时算起，发送操作本身花费的时间会被扣除
+    per_minute: 全局每分钟最多发送的消息数量（令牌桶，允许 burst 条的突发）
+    recipient_gap: 发给同一个用户的相邻两条消息之间的最小间隔（秒）
+    jitter: 每次等待额外增加 0~jitter 秒的随机时间
+"""
+import time
+import random
+
+
+class RateLimiter:
+    def __init__(self, interval=0.0, per_minute=0, recipient_gap=0.0, jitter=0.0, burst=1,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            interval: 相邻消息的最小间隔（秒）
+            per_minute: 每分钟最多发送的消息数量，0 表示不限制
+            recipient_gap: 同一用户相邻消息的最小间隔（秒）
+            jitter: 随机抖动的最大值（秒）
+            burst: 令牌桶的容量，即允许连续发送的消息数量
+            clock: 单调时钟函数
+            sleep: 等待函数
+        """
+        self.interval = float(interval)
+        self.per_minute = per_minute
+        self.recipient_gap = float(recipient_gap)
+        self.jitter = float(jitter)
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.sleep = sleep
+
+        # 上一条消息的发送时间，以及每个用户上一条消息的发送时间
+        self._last = None
+        self._last_by_recipient = {}
+        # 令牌桶的令牌数量及其更新时间
+        self._tokens = float(self.burst)
+        self._updated = None
+
+    def _refill(self, now):
+        if self._updated is not None and self.per_minute > 0:
+            rate = self.per_minute / 60
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * rate)
+        self._updated = now
+
+    def delay(self, recipient=None):
+        """
+        计算现在发送一条消息还需要等待的时间（不含随机抖动）
+        """
+        now = self.clock()
+        self._refill(now)
+        wait = 0.0
+        if self.interval > 0 and self._last is not None:
+            wait = max(wait, self._last + self.interval - now)
+        if self.recipient_gap > 0 and recipient in self._last_by_recipient:
+            wait = max(wait, self._last_by_recipient[recipient] + self.recipient_gap - now)
+        if self.per_minute > 0 and self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) / (self.per_minute / 60))
+        return wait
+
+    def acquire(self, recipient=None, should_stop=None) -> bool:
+        """
+        等待直到允许发送下一条消息，并记录本次发送
+        Args:
+            recipient: 接收消息的用户
+            should_stop: 无参数的函数，返回真值时立即停止等待
+        Return:
+            是否可以发送（等待被 should_stop 中断时返回False）
+        """
+        deadline = self.clock() + self.delay(recipient)
+        if self.jitter > 0:
+            deadline += random.uniform(0, self.jitter)
+
+        # 分段等待，以便及时响应停止发送
+        while True:
+            if should_stop is not None and should_stop():
+                return False
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                break
+            self.sleep(min(remaining, 0.1))
+
+        now = self.clock()
+        self._refill(now)
+        if self.per_minute > 0:
+            self._tokens = max(0.0, self._tokens - 1)
+        self._last = now
+        if self.recipient_gap > 0:
+            self._last_by_recipient[recipient] = now
+        return True
@@ -0,0 +1,276 @@
+"""
+定时任务调度。
+定时列表中的每一行只在列表变化时解析一次，解析后的任务按下一次触发时间放入最小堆。
+调度线程只需查看堆顶就知道需要等待多久，到期时弹出堆顶任务，周期任务计算下一次触发时间后重新入堆。
+
+错过的任务（例如上一次发送花费了很长时间，等待结束时已经超过触发时间 grace 秒以上）按 policy 处理：
+    late: 补发一次，同一个周期任务错过多次时只补发最近的一次
+    skip: 直接跳过
+    catchup: 按顺序补发全部错过的触发
+
+定时列表中的一行为 "年 月 日 时 分 [星期] 起点-终点"，星期可以省略。每个时间字段都可以写成类似 cron 的规则：
+    *       不限
+    a,b,c   多个取值
+    a-b     范围（包括两端）
+    */n     从最小值开始每隔 n
+    a-b/n   范围内每隔 n
+星期为 1~7（周一~周日，0 也表示周日）。日和星期同时限制时需要两者都满足。
+所有字段都是单个数值且没有星期时是只触发一次的任务，否则是周期任务。
+"""
+import heapq
+import bisect
+import datetime
+
+
+class OnceEntry:
+    # 只触发一次的定时发送任务，对应定时列表中的一行 "年 月 日 时 分 起点-终点"
+    kind = "send"
+
+    def __init__(self, text, due, st, ed):
+        self.text = text
+        self.due = due
+        self.st = st
+        self.ed = ed
+
+    def next_fire(self, after):
+        """返回晚于 after 的下一次触发时间（时间戳），没有时返回None"""
+        return self.due if self.due > after else None
+
+    def __repr__(self):
+        return f"OnceEntry({self.text!r})"
+
+
+class IntervalEntry:
+    # 从 start 开始每隔 period 秒触发一次的任务，如防止自动下线
+    def __init__(self, kind, period, start):
+        self.kind = kind
+        self.text = f"{kind}/{period}"
+        self.period = period
+        self.start = start
+
+    def next_fire(self, after):
+        if after < self.start:
+            return self.start
+        return self.start + ((after - self.start) // self.period + 1) * self.period
+
+    def __repr__(self):
+        return f"IntervalEntry({self.kind!r}, {self.period})"
+
+
+class CronEntry:
+    # 按类似 cron 的规则周期触发的定时发送任务
+    kind = "send"
+    # 找不到下一次触发时间时最多尝试的次数，避免如 "* 2 30 ..." 这样永远不会触发的规则无限循环
+    MAX_STEPS = 10000
+
+    def __init__(self, text, years, months, days, hours, minutes, weekdays, st, ed):
+        """
+        Args:
+            years: 年份的有序列表，为空时不限
+            months, days, hours, minutes: 对应字段允许取值的有序列表
+            weekdays: 允许的星期集合（0~6，周一为0），为空时不限
+        """
+        self.text = text
+        self.years = years
+        self.months = months
+        self.days = days
+        self.hours = hours
+        self.minutes = minutes
+        self.weekdays = weekdays
+        self.st = st
+        self.ed = ed
+
+    @staticmethod
+    def _next_in(values, value):
+        # 有序列表中大于等于 value 的最小值，没有时返回None
+        i = bisect.bisect_left(values, value)
+        return values[i] if i < len(values) else None
+
+    def next_fire(self, after):
+        # 从 after 之后的下一分钟开始，逐级（年、月、日、时、分）跳到下一个允许的取值
+        t = datetime.datetime.fromtimestamp(after).replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        for _ in range(self.MAX_STEPS):
+            if self.years:
+                year = self._next_in(self.years, t.year)
+                if year is None:
+                    return None
+                if year != t.year:
+                    t = datetime.datetime(year, 1, 1)
+                    continue
+
+            month = self._next_in(self.months, t.month)
+            if month is None:
+                t = datetime.datetime(t.year + 1, 1, 1)
+                continue
+            if month != t.month:
+                t = datetime.datetime(t.year, month, 1)
+                continue
+
+            if t.day not in self.days or (self.weekdays and t.weekday() not in self.weekdays):
+                t = datetime.datetime(t.year, t.month, t.day) + datetime.timedelta(days=1)
+                continue
+
+            hour = self._next_in(self.hours, t.hour)
+            if hour is None:
+                t = datetime.datetime(t.year, t.month, t.day) + datetime.timedelta(days=1)
+                continue
+            if hour != t.hour:
+                t = t.replace(hour=hour, minute=0)
+                continue
+
+            minute = self._next_in(self.minutes, t.minute)
+            if minute is None:
+                t = t.replace(minute=0) + datetime.timedelta(hours=1)
+                continue
+            return t.replace(minute=minute).timestamp()
+        return None
+
+    def __repr__(self):
+        return f"CronEntry({self.text!r})"
+
+
+def parse_field(text, low, high):
+    """
+    解析一个时间字段
+    Args:
+        text: 字段文本，如 "*"、"1,3,5"、"9-18"、"*/10"
+        low: 字段的最小值
+        high: 字段的最大值
+    Return:
+        允许取值的有序列表，格式错误或超出范围时抛出 ValueError
+    """
+    values = set()
+    for part in text.split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if step <= 0:
+            raise ValueError(f"步长必须大于0: {text}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"超出范围 {low}~{high}: {text}")
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+def parse_schedule(text):
+    """
+    解析定时列表中的一行
+    Args:
+        text: 形如 "2026 10 18 9 30 1-3" 或 "* * * 9-18 */10 1-5 1-3" 的文本
+    Return:
+        OnceEntry 或 CronEntry，格式错误时抛出 ValueError
+    """
+    fields = text.split()
+    if len(fields) == 6:
+        *fields, st_ed = fields
+        weekday = "*"
+    elif len(fields) == 7:
+        *fields, weekday, st_ed = fields
+    else:
+        raise ValueError(f"字段数量错误: {text}")
+    year, month, day, hour, minute = fields
+    st, ed = (int(v) for v in st_ed.split("-"))
+
+    if weekday == "*" and all(field.isdigit() for field in fields):
+        due = datetime.datetime(int(year), int(month), int(day), int(hour), int(minute)).timestamp()
+        return OnceEntry(text, due, st, ed)
+
+    years = [] if year == "*" else parse_field(year, 1970, 9999)
+    # 星期 1~7 转换为 datetime.weekday() 的 0~6，0 也表示周日
+    weekdays = set() if weekday == "*" else {(v - 1) % 7 for v in parse_field(weekday, 0, 7)}
+    return CronEntry(text, years, parse_field(month, 1, 12), parse_field(day, 1, 31),
+                     parse_field(hour, 0, 23), parse_field(minute, 0, 59), weekdays, st, ed)
+
+
+class Scheduler:
+    POLICIES = ("late", "skip", "catchup")
+
+    def __init__(self, policy="late", grace=60.0):
+        """
+        Args:
+            policy: 错过任务时的处理方式，见模块说明
+            grace: 超过触发时间多少秒以内仍视为按时触发
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的处理方式: {policy}")
+        self.policy = policy
+        self.grace = grace
+        # 堆中的元素为 (触发时间, 序号, 任务)，序号保证触发时间相同的任务按加入顺序弹出
+        self.heap = []
+        self._seq = 0
+        # 已经触发过的 (任务文本, 触发时间)，重新装载任务时避免重复触发
+        self._fired = {}
+        # 解析失败的行
+        self.invalid = []
+
+    def _push(self, due, entry):
+        heapq.heappush(self.heap, (due, self._seq, entry))
+        self._seq += 1
+
+    def set_entries(self, entries, now):
+        """
+        重新装载全部任务。触发时间在 now 之前 grace 秒以内且尚未触发的任务仍会被触发
+        Args:
+            entries: 任务列表
+            now: 当前时间戳
+        """
+        self._fired = {key: due for key, due in self._fired.items() if due >= now - self.grace}
+        self.heap = []
+        for entry in entries:
+            due = entry.next_fire(now - self.grace)
+            while due is not None and (entry.text, due) in self._fired:
+                due = entry.next_fire(due)
+            if due is not None:
+                self._push(due, entry)
+
+    def load(self, texts, now, extra=()):
+        """
+        解析定时列表的文本并装载，解析失败的行记录在 invalid 中
+        Args:
+            texts: 定时列表中每一行的文本
+            now: 当前时间戳
+            extra: 额外的任务，如防止自动下线
+        """
+        entries = list(extra)
+        self.invalid = []
+        for text in texts:
+            try:
+                entries.append(parse_schedule(text))
+            except ValueError:
+                self.invalid.append(text)
+        self.set_entries(entries, now)
+
+    def next_due(self):
+        """返回最近一次触发的时间戳，没有任务时返回None"""
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        """
+        弹出所有到期的任务
+        Args:
+            now: 当前时间戳
+        Return:
+            需要执行的 (任务, 触发时间) 列表，按触发时间排序
+        """
+        result = []
+        while self.heap and self.heap[0][0] <= now:
+            due, _, entry = heapq.heappop(self.heap)
+            next_due = entry.next_fire(due)
+            if next_due is not None:
+                self._push(next_due, entry)
+            self._fired[(entry.text, due)] = due
+
+            if now - due > self.grace:
+                if self.policy == "skip":
+                    continue
+                # 同一个任务还有更晚的触发也已经错过，只保留最后一次
+                if self.policy == "late" and next_due is not None and next_due <= now:
+                    continue
+            result.append((entry, due))
+        return result
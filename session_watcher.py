@@ -0,0 +1,176 @@
+"""
+会话列表的新消息监视。
+原来的 check_new_msg 通过反复双击“聊天”按钮、逐个点击有未读消息的会话来发现新消息，每次检测都会移动鼠标、抢占焦点。
+SessionWatcher 只读取左侧会话列表中每个会话的名称、最后一条消息的预览、时间和未读数量，不做任何点击。
+每次读取得到一个快照，与上一次的快照比较：未读数量增加或预览变化的会话即为收到了新消息。
+当前在前台打开的聊天收到消息时微信不会增加未读数量，因此对该聊天比较预览和时间的变化（排除自己发送的消息）。
+
+后端支持控件变化事件时（见 WeChatBackend.subscribe_changes），会话列表变化后立即读取快照；
+不支持时（如 uiautomation 后端）按 interval 定时读取。新消息会调用回调函数，同时放入 queue 中。
+"""
+import queue
+import threading
+
+
+class SessionState:
+    def __init__(self, name, preview, unread, time=""):
+        # 会话名称、最后一条消息的预览、未读消息的数量以及最后一条消息的时间（会话列表中显示的文本）
+        self.name = name
+        self.preview = preview
+        self.unread = unread
+        self.time = time
+
+    def __eq__(self, other):
+        return (isinstance(other, SessionState) and (self.name, self.preview, self.unread, self.time) ==
+                (other.name, other.preview, other.unread, other.time))
+
+    def __repr__(self):
+        return f"SessionState({self.name!r}, {self.preview!r}, {self.unread}, {self.time!r})"
+
+
+class SessionEvent:
+    def __init__(self, name, preview, unread, new_count):
+        # 会话名称、最后一条消息的预览、当前未读数量以及相比上一次快照新增的消息数量（无法确定时为1）
+        self.name = name
+        self.preview = preview
+        self.unread = unread
+        self.new_count = new_count
+
+    def __repr__(self):
+        return f"SessionEvent({self.name!r}, {self.preview!r}, unread={self.unread}, new={self.new_count})"
+
+
+def _parse_unread(text):
+    # 未读数量可能显示为 "99+" 等非数字的形式
+    digits = "".join(c for c in text if c.isdigit())
+    return int(digits) if digits else 1
+
+
+def read_sessions(list_control):
+    """
+    读取会话列表中所有可见会话的状态，不做任何点击
+    Args:
+        list_control: 会话列表控件
+    Return:
+        SessionState 列表，按会话列表中的顺序排列
+    """
+    states = []
+    for item in list_control.GetChildren():
+        pane = item.GetFirstChildControl()
+        if pane is None:
+            continue
+        # 会话的子控件为 [头像按钮, 名称、时间与预览, 未读数量（有未读消息时才有）]
+        children = pane.GetChildren()
+        if len(children) < 2:
+            continue
+        name = children[0].Name
+        texts = children[1].GetChildren()
+        preview = texts[-1].Name if texts else ""
+        time = texts[1].Name if len(texts) >= 3 else ""
+        unread = _parse_unread(children[2].Name) if len(children) >= 3 else 0
+        states.append(SessionState(name, preview, unread, time))
+    return states
+
+
+def diff_sessions(prev, cur, current=None, is_own=None):
+    """
+    比较两次快照，找出收到新消息的会话
+    Args:
+        prev: 上一次的快照，会话名称 -> SessionState
+        cur: 本次的 SessionState 列表
+        current: 当前在前台打开的聊天名称
+        is_own: 函数 is_own(名称, 预览)，判断预览是否为自己刚发送的消息。为空时当前聊天的预览变化都视为新消息
+    Return:
+        SessionEvent 列表
+    """
+    events = []
+    for state in cur:
+        old = prev.get(state.name)
+        if state.unread == 0:
+            # 打开的聊天收到新消息时未读数量保持为0，只能通过预览或时间的变化发现
+            if (state.name == current and old is not None and (state.preview, state.time) != (old.preview, old.time)
+                    and not (is_own is not None and is_own(state.name, state.preview))):
+                events.append(SessionEvent(state.name, state.preview, 0, 1))
+            continue
+        if old is None:
+            # 新出现在可见区域内的会话，未读数量即为新消息数量
+            events.append(SessionEvent(state.name, state.preview, state.unread, state.unread))
+        elif state.unread > old.unread:
+            events.append(SessionEvent(state.name, state.preview, state.unread, state.unread - old.unread))
+        elif state.preview != old.preview:
+            events.append(SessionEvent(state.name, state.preview, state.unread, 1))
+    return events
+
+
+class SessionWatcher:
+    def __init__(self, backend, get_list, callback=None, interval=0.3, get_current=None, is_own=None):
+        """
+        Args:
+            backend: 自动化后端
+            get_list: 无参数的函数，返回会话列表控件（如 lambda: wechat.locate("sessions")）
+            callback: 收到新消息时调用 callback(event)，event 为 SessionEvent
+            interval: 定时读取快照的间隔（秒）。后端支持变化事件时，作为等待事件的最长时间
+            get_current: 无参数的函数，返回当前在前台打开的聊天名称，见 diff_sessions
+            is_own: 判断预览是否为自己发送的消息的函数，见 diff_sessions
+        """
+        self.backend = backend
+        self.get_list = get_list
+        self.callback = callback
+        self.interval = interval
+        self.get_current = get_current
+        self.is_own = is_own
+        self.queue = queue.Queue()
+        # 会话名称 -> 上一次快照中的状态；第一次读取只建立基准，不产生事件
+        self.snapshot = None
+        self.is_stopped = False
+        self._changed = threading.Event()
+        self._unsubscribe = None
+
+    def poll(self):
+        """
+        读取一次快照并与上一次比较
+        Return:
+            SessionEvent 列表
+        """
+        # 一次读取会话列表的快照，逐个会话解析时不再跨进程读取控件
+        states = read_sessions(self.backend.snapshot(self.get_list()))
+        if self.snapshot is None:
+            events = []
+        else:
+            current = self.get_current() if self.get_current is not None else None
+            events = diff_sessions(self.snapshot, states, current, self.is_own)
+        # 滚出可见区域的会话保留上一次的状态，避免重新出现时被误认为有新消息
+        snapshot = dict(self.snapshot or {})
+        snapshot.update((state.name, state) for state in states)
+        self.snapshot = snapshot
+
+        for event in events:
+            self.queue.put(event)
+            if self.callback is not None:
+                self.callback(event)
+        return events
+
+    def _on_change(self):
+        self._changed.set()
+
+    def run(self):
+        """持续监视，直到调用 stop()"""
+        self.is_stopped = False
+        self._unsubscribe = self.backend.subscribe_changes(self.get_list(), self._on_change)
+        try:
+            while not self.is_stopped:
+                self.poll()
+                if self._unsubscribe is not None:
+                    # 等待变化事件，超时后也读取一次，以防漏掉事件
+                    self._changed.wait(self.interval)
+                    self._changed.clear()
+                else:
+                    self.backend.sleep(self.interval)
+        finally:
+            if self._unsubscribe is not None:
+                self._unsubscribe()
+                self._unsubscribe = None
+
+    def stop(self):
+        self.is_stopped = True
+        self._changed.set()
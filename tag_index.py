@@ -0,0 +1,165 @@
+"""
+好友标签的倒排索引。
+每个标签对应一个位图（Python 的整数），第 i 位为 1 表示第 i 个好友带有该标签。
+多个标签的与、或、非直接在位图上按位运算，几万个好友的查询也只需要很少的时间。
+
+查询语法：
+    同事 北京            同时带有两个标签（空格等价于 AND）
+    客户 OR 供应商        带有任意一个标签，也可以写成 客户 | 供应商
+    客户 AND NOT 黑名单   带有前者且不带后者，也可以写成 客户 & !黑名单
+    (客户 | 供应商) !黑名单  使用括号组合
+标签本身含有空格或运算符时用英文双引号括起来，如 "VIP 客户"。AND、OR、NOT 不区分大小写。
+运算的优先级为 NOT 最高、AND（包括空格）其次、OR 最低，因此 客户 OR 供应商 NOT 黑名单 表示
+客户 OR (供应商 AND NOT 黑名单)，需要排除两者中的黑名单时写成 (客户 OR 供应商) NOT 黑名单。
+"""
+import re
+
+# 好友的标签栏中多个标签之间的分隔符
+TAG_SEPARATORS = re.compile(r"[,，、;；]")
+TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|(&)|(\|)|(!)|"([^"]*)"|([^\s()&|!"]+))')
+
+
+def split_tags(label):
+    """将标签栏的文本拆分为标签列表"""
+    if not label:
+        return []
+    return [tag.strip() for tag in TAG_SEPARATORS.split(label) if tag.strip()]
+
+
+class TagIndex:
+    def __init__(self, rows=()):
+        """
+        Args:
+            rows: 好友的 (昵称, 备注, 标签) 列表
+        """
+        # 第 i 个好友的昵称和备注
+        self.names = []
+        self.notes = []
+        # 标签 -> 位图
+        self.bitmaps = {}
+        for row in rows:
+            self.add(*row[:3])
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        从本地好友目录（contact_store.ContactStore）建立索引，不包括已删除的好友
+        """
+        return cls(row[:3] for row in store.contacts("contact"))
+
+    def add(self, name, note, label):
+        bit = 1 << len(self.names)
+        self.names.append(name)
+        self.notes.append(note)
+        for tag in split_tags(label):
+            self.bitmaps[tag] = self.bitmaps.get(tag, 0) | bit
+
+    def tags(self):
+        """返回所有标签及其好友数量"""
+        return {tag: bin(bitmap).count("1") for tag, bitmap in self.bitmaps.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    def query_bitmap(self, expr):
+        """
+        计算查询表达式对应的位图，语法错误时抛出 ValueError
+        """
+        tokens = self._tokenize(expr)
+        pos = 0
+        everyone = (1 << len(self.names)) - 1
+
+        def peek():
+            return tokens[pos] if pos < len(tokens) else None
+
+        def take():
+            nonlocal pos
+            pos += 1
+            return tokens[pos - 1]
+
+        # expr := term (OR term)*
+        def parse_or():
+            result = parse_and()
+            while peek() == ("op", "OR"):
+                take()
+                result |= parse_and()
+            return result
+
+        # term := factor ((AND)? factor)*
+        def parse_and():
+            result = parse_not()
+            while peek() is not None and peek() not in (("op", "OR"), ("op", ")")):
+                if peek() == ("op", "AND"):
+                    take()
+                result &= parse_not()
+            return result
+
+        # factor := NOT factor | ( expr ) | 标签
+        def parse_not():
+            token = peek()
+            if token is None:
+                raise ValueError(f"查询不完整: {expr}")
+            take()
+            if token == ("op", "NOT"):
+                return everyone & ~parse_not()
+            if token == ("op", "("):
+                result = parse_or()
+                if peek() != ("op", ")"):
+                    raise ValueError(f"缺少右括号: {expr}")
+                take()
+                return result
+            if token[0] == "op":
+                raise ValueError(f"意外的运算符 {token[1]}: {expr}")
+            return self.bitmaps.get(token[1], 0)
+
+        result = parse_or()
+        if pos != len(tokens):
+            raise ValueError(f"意外的运算符 {tokens[pos][1]}: {expr}")
+        return result
+
+    @staticmethod
+    def _tokenize(expr):
+        tokens = []
+        pos = 0
+        expr = expr.rstrip()
+        while pos < len(expr):
+            match = TOKEN_PATTERN.match(expr, pos)
+            if match is None:
+                raise ValueError(f"无法解析的查询: {expr}")
+            pos = match.end()
+            lparen, rparen, and_, or_, not_, quoted, word = match.groups()
+            if lparen:
+                tokens.append(("op", "("))
+            elif rparen:
+                tokens.append(("op", ")"))
+            elif and_ or (word and word.upper() == "AND"):
+                tokens.append(("op", "AND"))
+            elif or_ or (word and word.upper() == "OR"):
+                tokens.append(("op", "OR"))
+            elif not_ or (word and word.upper() == "NOT"):
+                tokens.append(("op", "NOT"))
+            else:
+                tokens.append(("tag", quoted if quoted is not None else word))
+        return tokens
+
+    def query(self, expr, prefer_note=True):
+        """
+        查询满足表达式的好友
+        Args:
+            expr: 查询表达式，见模块说明
+            prefer_note: 是否优先返回备注（没有备注时返回昵称），备注可以直接用于搜索联系人
+        Return:
+            好友名称列表，按好友在通讯录中的顺序排列
+        """
+        bitmap = self.query_bitmap(expr)
+        result = []
+        i = 0
+        while bitmap:
+            # 跳过连续的 0 位
+            low = bitmap & -bitmap
+            i += low.bit_length() - 1
+            bitmap >>= low.bit_length()
+            name = self.notes[i] if prefer_note and self.notes[i] else self.names[i]
+            result.append(name)
+            i += 1
+        return result
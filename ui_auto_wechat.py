@@ -1,48 +1,34 @@
 import time
-import uiautomation as auto
-import subprocess
+import datetime
+import collections
+import itertools
 # import numpy as np
 # import pandas as pd
-from custom_libs import numpy_utils  # 自定义库替代 numpy
 from custom_libs import pandas_utils  # 自定义库替代 pandas
-import pyperclip
-import os
-import pyautogui
-
-
-from ctypes import *
-from PIL import ImageGrab
-from clipboard import setClipboardFiles
-from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QMimeData, QUrl
 from typing import List
 
 from wechat_locale import WeChatLocale
+from wechat_locator import LocatorCache
+from wechat_wait import Waiter
+from wechat_scanner import scan_list, scan_list_upward
+from session_watcher import SessionWatcher
+from wechat_time import parse_time_separator
+from media_export import MediaExporter
 
 
-# 鼠标移动到控件上
-def move(element):
-    x, y = element.GetPosition()
-    auto.SetCursorPos(x, y)
-
-
-# 鼠标快速点击控件
-def click(element):
-    x, y = element.GetPosition()
-    auto.Click(x, y)
-
-
-# 鼠标右键点击控件
-def right_click(element):
-    x, y = element.GetPosition()
-    auto.RightClick(x, y)
+class SendRecord:
+    """
+    一条文本消息的发送状态
+    status: "pending"（等待延后校验）、"sent"（已发送但未校验）、"verified"（校验成功）或 "failed"（校验失败）
+    """
+    def __init__(self, chat, text, status="sent"):
+        self.chat = chat
+        self.text = text
+        self.status = status
+        self.time = time.time()
 
-
-# 鼠标快速点击两下控件
-def double_click(element):
-    x, y = element.GetPosition()
-    auto.SetCursorPos(x, y)
-    element.DoubleClick()
+    def __repr__(self):
+        return f"SendRecord({self.chat!r}, {self.text!r}, {self.status!r})"
 
 
 # 微信的控件介绍。注意"depth"是直接调用auto进行控件搜索的深度（见函数内部代码示例）
@@ -57,83 +43,304 @@ def double_click(element):
 
 
 class WeChat:
-    def __init__(self, path, locale="zh-CN"):
+    # 微信主窗口的窗口类名，用于查找正在运行的微信
+    WINDOW_CLASS = "WeChatMainWndForPC"
+
+    # 常用控件的定位方式：语言键 -> (控件类型, 相对于微信主窗口的深度)。深度为空时搜索主窗口的全部后代
+    LOCATORS = {
+        "search":       ("EditControl", 7),
+        "send":         ("ButtonControl", 14),
+        "chats":        ("ButtonControl", None),
+        "contacts":     ("ButtonControl", None),
+        "contact":      ("ListControl", None),
+        "message":      ("ListControl", None),
+        "sessions":     ("ListControl", 8),
+        "search_result": ("ListControl", None),
+        "chat_history": ("ButtonControl", 13),
+        # 以下控件的名称随聊天变化，不在语言映射中
+        "chat_title":   ("ButtonControl", 13),
+        "input":        ("EditControl", None),
+    }
+
+    # 聊天内容的类型编号（见 _detect_type）对应的名称
+    DIALOG_TYPES = {0: '用户发送', 1: '时间信息', 2: '红包信息', 3: '"查看更多消息"标志', 4: '撤回消息',
+                    5: "System Notification", 6: '"以下是新消息"标志'}
+
+    def __init__(self, path, locale="zh-CN", backend=None):
+        """
+        Args:
+            path: 微信的打开路径
+            locale: 微信的语言版本
+            backend: 自动化后端（见 wechat_backend.py），默认使用基于 uiautomation 的真实桌面后端。
+                     传入 wechat_simulator.SimulatedWeChat 可以在没有微信客户端的环境下运行
+        """
         # 微信打开路径
         self.path = path
         
-        # 用于复制内容到剪切板
-        self.app = QApplication([])
+        # 自动化后端，负责所有的控件搜索、鼠标键盘以及剪切板操作
+        if backend is None:
+            from wechat_uia_backend import UIAutomationBackend
+            backend = UIAutomationBackend()
+        self.backend = backend
+        
+        # 微信主窗口以及以其为根的控件缓存
+        self._window = None
+        self._window_handle = None
+        self._window_name = None
+        self.locators = LocatorCache(backend)
+        
+        # 基于界面条件的等待，代替固定时长的sleep
+        self.waiter = Waiter(backend)
+        
+        # 是否优先通过 ValuePattern 直接设置输入框的文本（不支持时自动回退到剪切板粘贴）
+        self.use_value_pattern = True
+        # 记录各个输入框是否支持直接设置文本，避免每次都重复尝试
+        self._value_pattern_support = {}
+        
+        # 发送文本消息后的校验方式：
+        # "off" 不校验；"sync" 每条消息发送后立即校验；"sampled" 每 verify_every 条消息校验一次；
+        # "deferred" 先记录下来，在 verify_pending() 中一次性校验（切换到其他聊天前会自动校验）
+        self.verify_mode = "sync"
+        self.verify_every = 10
+        # 每条文本消息的发送状态记录，以及等待延后校验的记录
+        self.send_records = collections.deque(maxlen=10000)
+        self._pending_verify = []
+        self._send_count = 0
+        
+        # 当前打开的聊天窗口名称
+        self.current_chat = None
+        # 搜索的名称 -> 搜索后打开的聊天标题（两者不同时，如按备注或模糊匹配搜索）
+        self._contact_titles = {}
+        
+        # 每个聊天上一次 get_new_dialogs 读到的最后一条消息的指纹
+        self.dialog_cursors = {}
+        
+        # 本地的好友、群聊目录（contact_store.ContactStore），设置后获取好友或群聊时会同步到目录中
+        self.contact_store = None
+        
+        # 聊天记录的本地归档（chat_archive.ChatArchive），archive_chats 使用
+        self.chat_archive = None
+        # 归档的全文检索索引（chat_search.ChatSearchIndex），search_chats 使用，归档新消息后自动更新
+        self.chat_search = None
         
         # 自动回复的联系人列表
         self.auto_reply_contacts = []
         
         # 自动回复的内容
         self.auto_reply_msg = "[自动回复]您好，我现在正在忙，稍后会主动联系您，感谢理解。"
+        
+        # 自动回复规则（auto_reply.AutoReplyEngine），为空时只对 auto_reply_contacts 使用 auto_reply_msg 回复
+        self.auto_reply_engine = None
 
         assert locale in WeChatLocale.getSupportedLocales()
         self.lc = WeChatLocale(locale)
         
-    # 打开微信客户端
-    def open_wechat(self):
-        subprocess.Popen(self.path)
+    # 查找正在运行的微信主窗口，返回窗口句柄，没有运行时返回0
+    def find_wechat_window(self):
+        if self._window_handle and self.backend.is_window(self._window_handle):
+            return self._window_handle
+        return self.backend.find_window(self.WINDOW_CLASS)
+    
+    # 打开微信客户端。微信已经在运行时直接激活已有的窗口，只有找不到窗口时才启动程序
+    def open_wechat(self, timeout: float = 10):
+        handle = self.find_wechat_window()
+        if not handle:
+            self.backend.launch(self.path)
+            # 等待主窗口出现
+            waited = 0
+            while not handle and waited < timeout:
+                handle = self.backend.find_window(self.WINDOW_CLASS)
+                if not handle:
+                    self.backend.sleep(0.5)
+                    waited += 0.5
+            if not handle:
+                return
+        
+        self.backend.activate_window(handle)
     
-    # 搜寻微信客户端控件
+    # 搜寻微信客户端控件，窗口句柄仍然有效时直接使用上一次找到的窗口
     def get_wechat(self):
-        return auto.WindowControl(Depth=1, Name=self.lc.weixin)
+        if (self._window is not None and self._window_name == self.lc.weixin
+                and self.backend.is_window(self._window_handle)):
+            return self._window
+        
+        # 优先通过窗口类名找到窗口句柄，找不到时再按名称搜索
+        handle = self.backend.find_window(self.WINDOW_CLASS)
+        if handle:
+            self._window = self.backend.control_from_handle(handle)
+        else:
+            self._window = self.backend.get_root().WindowControl(Depth=1, Name=self.lc.weixin)
+        self._window_handle = self._window.NativeWindowHandle
+        self._window_name = self.lc.weixin
+        return self._window
+    
+    # 获取微信主窗口内的常用控件（见 LOCATORS），优先使用缓存。name 为空时使用语言映射中的名称
+    def locate(self, key, name=None, exists_timeout=None):
+        control_type, depth = self.LOCATORS[key]
+        if name is None:
+            name = getattr(self.lc, key, None)
+        return self.locators.get(key, self.get_wechat(), control_type, name, depth, exists_timeout)
     
     # 防止微信长时间挂机导致掉线
     def prevent_offline(self):
         self.open_wechat()
         self.get_wechat()
         
-        search_box = auto.EditControl(Depth=8, Name=self.lc.search)
-        click(search_box)
+        search_box = self.locate("search")
+        self.backend.click(search_box)
+    
+    # 读取当前打开的聊天窗口的标题（即上方的聊天名称按钮），没有打开聊天时返回None。
+    # 聊天标题按钮没有固定的名称，只能按类型和深度查找，同一深度还有“聊天记录”按钮，
+    # 因此找到的按钮名称为空或是“聊天记录”时不是聊天标题，丢弃缓存
+    def get_chat_title(self):
+        try:
+            title = self.locate("chat_title", exists_timeout=0).Name
+        except LookupError:
+            return None
+        if not title or title == self.lc.chat_history:
+            self.locators.invalidate("chat_title")
+            return None
+        return title
+    
+    # 获取当前聊天窗口的输入框，输入框的名称与聊天名称相同。
+    # 没有打开聊天时名称为空，按名称搜索会找到搜索框，因此直接抛出 LookupError
+    def _input_box(self):
+        title = self.get_chat_title()
+        if title is None:
+            raise LookupError("没有打开的聊天窗口")
+        return self.locate("input", name=title)
+    
+    # 打开要发送的聊天。需要搜索时返回是否切换到了该聊天，不需要搜索时返回当前是否打开了聊天
+    def _open_target(self, name, search_user):
+        if search_user:
+            return self.get_contact(name)
+        return self.get_chat_title() is not None
+    
+    # 判断输入框中的内容是否与指定文本一致（输入框中的换行可能是\r）
+    def _value_equals(self, control, text):
+        value = self.backend.get_value(control)
+        return value.replace("\r\n", "\n").replace("\r", "\n") == text
+    
+    def _fill_text(self, key, control, text) -> str:
+        """
+        将文本输入到输入框中。优先通过 ValuePattern 直接设置并校验，不支持时回退到剪切板粘贴。
+        Args:
+            key: 输入框的键（"search" 或 "input"），用于记录该输入框是否支持直接设置文本
+            control: 输入框控件
+            text: 输入的文本
+        Return:
+            实际使用的输入方式，"value" 或 "clipboard"
+        """
+        if self.use_value_pattern and self._value_pattern_support.get(key, True):
+            if self.backend.set_value(control, text) and \
+                    self.waiter.until(lambda: self._value_equals(control, text), f"{key}_set_value"):
+                self._value_pattern_support[key] = True
+                return "value"
+            self._value_pattern_support[key] = False
+        
+        self.backend.copy_text(text)
+        self.backend.click(control)
+        self.backend.send_keys("{Ctrl}v")
+        # 等待输入框的内容变为粘贴的文本
+        self.waiter.until(lambda: self._value_equals(control, text), f"{key}_paste")
+        return "clipboard"
+    
+    # 记录消息列表当前的状态：(可见的消息数量, 最后一条消息的内容, 滚动范围)。
+    # 虚拟化的列表中连续发送相同的文本时可见的行不变，但可见区域占比（即总行数）会变化
+    @staticmethod
+    def _message_list_state(list_control):
+        children = list_control.GetChildren()
+        scroll_pattern = list_control.GetScrollPattern()
+        extent = scroll_pattern.VerticalViewSize if scroll_pattern is not None else None
+        return len(children), children[-1].Name if children else None, extent
+    
+    # 等待发送完成：输入框被清空，或者消息列表出现新的消息
+    def _wait_sent(self, list_control, before, input_box, filled, name):
+        def sent():
+            if filled and self.backend.get_value(input_box) != filled:
+                return True
+            return self._message_list_state(list_control) != before
+        return self.waiter.until(sent, name)
     
     # 搜索指定用户
-    def get_contact(self, name):
+    def get_contact(self, name) -> bool:
+        """
+        Return:
+            聊天窗口是否在期限内切换到了该用户
+        """
         self.open_wechat()
         self.get_wechat()
+        self._verify_before_switch(name)
         
-        pyperclip.copy(name)
-        time.sleep(0.3)
-        search_box = auto.EditControl(Depth=8, Name=self.lc.search)
-        click(search_box)
+        # 该用户的聊天窗口已经打开时无需再次搜索。搜索的名称与聊天标题不一定相同（模糊匹配、备注、群名中的“、”），
+        # 因此还要与上一次搜索该名称时打开的聊天标题比较
+        before = self.get_chat_title()
+        if before is not None and before in (name, self._contact_titles.get(name)):
+            self.current_chat = name
+            return True
         
-        time.sleep(0.3)
-        auto.SendKeys("{Ctrl}v")
+        search_box = self.locate("search")
+        # 只有 SetValue 失败或输入框的内容与名称不一致时 _fill_text 才会改用剪切板粘贴。
+        # 聊天没有切换（如找不到该用户）不代表输入方式有问题，不会因此停用直接设置文本
+        self._fill_text("search", search_box, name)
+        # 回车打开的是第一个搜索结果
+        first = self._first_search_result()
+        self.backend.send_keys("{enter}", search_box)
         
+        # 等待聊天窗口切换到选中的搜索结果：标题变为其他聊天，或者标题与名称、第一个搜索结果一致
+        def switched():
+            title = self.get_chat_title()
+            return title is not None and (title != before or title in (name, first))
+        ok = self.waiter.until(switched, "chat_header")
         
-        # 等待客户端搜索联系人
-        time.sleep(0.3)
-        search_box.SendKeys("{enter}")
+        if ok:
+            self._contact_titles[name] = self.get_chat_title()
+        self.current_chat = name if ok else self.get_chat_title()
+        return ok
+    
+    # 读取搜索结果中的第一个结果（回车时打开的聊天），搜索结果不存在时返回None
+    def _first_search_result(self):
+        try:
+            items = self.locate("search_result", exists_timeout=0).GetChildren()
+        except LookupError:
+            return None
+        # 跳过“联系人”、“群聊”等分组标题
+        headings = (self.lc.contact, self.lc.contacts, self.lc.group_chat)
+        for item in items:
+            if item.Name and item.Name not in headings:
+                return item.Name
+        return None
     
     # 鼠标移动到发送按钮处点击发送消息
     def press_enter(self):
         # 获取发送按钮
-        send_button = auto.ButtonControl(Depth=15, Name=self.lc.send)
-        click(send_button)
+        send_button = self.locate("send")
+        self.backend.click(send_button)
     
-    def at(self, name, at_name, search_user: bool = True) -> None:
+    def at(self, name, at_name, search_user: bool = True) -> bool:
         """
         在指定群聊中@他人（若@所有人需具备@所有人权限）
         Args:
             name:  群聊名称
             at_name: 要@的人的昵称
             search_user: 是否需要搜索群聊
+        Return:
+            是否打开了该群聊并发送。找不到群聊时不会输入任何内容，返回False
         """
-        if search_user:
-            self.get_contact(name)
+        if not self._open_target(name, search_user):
+            return False
         
         # 如果at_name为空则代表@所有人
         if at_name == "":
-            auto.SendKeys("@{UP}{enter}")
+            self.backend.send_keys("@{UP}{enter}")
             self.press_enter()
         
         else:
-            auto.SendKeys(f"@{at_name}")
+            self.backend.send_keys(f"@{at_name}")
             # 按下回车键确认要at的人
-            auto.SendKeys("{enter}")
+            self.backend.send_keys("{enter}")
             self.press_enter()
+        return True
     
     def send_msg(self, name, text, search_user: bool = True) -> bool:
         """
@@ -142,133 +349,212 @@ class WeChat:
             name: 指定用户名的名称，输入搜索框后出现的第一个人
             text: 发送的文本信息
             search_user: 是否需要搜索用户
+        Return:
+            校验时返回消息是否发送成功；不校验（或延后校验）时返回消息列表是否出现了新消息。
+            找不到该用户（聊天窗口没有切换过去）时不会输入任何内容，记为 "failed" 并返回False
         """
-        if search_user:
-            self.get_contact(name)
-        pyperclip.copy(text)
-
-        # self.step_paste_execute()
-        time.sleep(0.5)
-        auto.SendKeys("{Ctrl}v")
-        time.sleep(0.3)
-        self.press_enter()
-
-        # 发送消息后马上获取聊天记录，判断是否发送成功
-        try:
-            if self.get_dialogs(name, 1, False)[0][2] == text:
-                return True
-            else:
-                return False
-            
-        except Exception:
+        record = SendRecord(name, text)
+        self.send_records.append(record)
+        # 聊天没有切换到该用户时，输入的内容会发到当前打开的其他聊天中
+        if not self._open_target(name, search_user):
+            record.status = "failed"
             return False
+        sent = self._fill_and_send(text)
+        self._send_count += 1
+        
+        if self.verify_mode == "deferred":
+            record.status = "pending"
+            self._pending_verify.append(record)
+            return sent
+        
+        if self.verify_mode == "sync" or (self.verify_mode == "sampled" and self._send_count % self.verify_every == 0):
+            # 发送消息后马上获取聊天记录，判断是否发送成功
+            try:
+                ok = self.get_dialogs(name, 1, False)[0][2] == text
+            except Exception:
+                ok = False
+            record.status = "verified" if ok else "failed"
+            return ok
+        
+        return sent
+    
+    # 切换到其他聊天之前，先校验上一个聊天中延后校验的消息（校验时需要读取该聊天的消息列表）。
+    # 所有切换聊天的地方（get_contact、check_new_msg 点击会话以及自动回复）都要先调用
+    def _verify_before_switch(self, name):
+        if self._pending_verify and self._pending_verify[0].chat != name:
+            self.verify_pending()
+    
+    def verify_pending(self) -> List[SendRecord]:
+        """
+        一次性校验延后校验的消息。只读取一次消息列表，从最新的消息往上依次与待校验的消息按顺序匹配，
+        匹配到的记为 "verified"，找不到的记为 "failed"。需要在这些消息所在的聊天窗口仍然打开时调用。
+        Return:
+            本次校验的记录列表
+        """
+        records, self._pending_verify = self._pending_verify, []
+        if not records:
+            return records
+        
+        try:
+            names = [item.Name for item in self.locate("message").GetChildren()]
+        except LookupError:
+            names = []
+        
+        # 待校验的消息在消息列表中的顺序不变，但中间可能夹杂着其他人的消息
+        i = len(names) - 1
+        for record in records[::-1]:
+            while i >= 0 and names[i] != record.text:
+                i -= 1
+            record.status = "verified" if i >= 0 else "failed"
+            i -= 1
+        
+        return records
     
     # 搜索指定用户名的联系人发送文件
-    def send_file(self, name: str, path: str, search_user: bool = True) -> None:
+    def send_file(self, name: str, path: str, search_user: bool = True) -> bool:
         """
         Args:
             name: 指定用户名的名称，输入搜索框后出现的第一个人
             path: 发送文件的本地地址
             search_user: 是否需要搜索用户
+        Return:
+            消息列表是否出现了新消息。找不到该用户时不会粘贴文件，返回False
         """
-        if search_user:
-            self.get_contact(name)
+        if not self._open_target(name, search_user):
+            return False
+        
+        list_control = self.locate("message")
+        before = self._message_list_state(list_control)
+        input_box = self._input_box()
+        value = self.backend.get_value(input_box)
         
         # 将文件复制到剪切板
-        setClipboardFiles([path])
+        self.backend.copy_files([path])
+        
+        # self.step_paste_execute()
+        self.backend.send_keys("{Ctrl}v")
+        # 等待文件出现在输入框中
+        self.waiter.until(lambda: self.backend.get_value(input_box) != value, "paste_file")
+        filled = self.backend.get_value(input_box)
+        self.press_enter()
+        return self._wait_sent(list_control, before, input_box, filled, "message_sent")
+    
+    # 在当前聊天窗口中输入文本并发送
+    def _fill_and_send(self, text):
+        list_control = self.locate("message")
+        before = self._message_list_state(list_control)
         
         # self.step_paste_execute()
-        time.sleep(0.3)
-        auto.SendKeys("{Ctrl}v")
-        time.sleep(0.3)
+        input_box = self._input_box()
+        self._fill_text("input", input_box, text)
+        filled = self.backend.get_value(input_box)
         self.press_enter()
+        return self._wait_sent(list_control, before, input_box, filled, "message_sent")
     
     # 获取所有通讯录中所有联系人
     def find_all_contacts(self) -> pandas_utils.DataFrame:
+        rows = self.iter_contacts()
+        if self.contact_store is not None:
+            rows = self.contact_store.sync_iter("contact", rows)
+        
+        contacts = pandas_utils.DataFrame(columns=["昵称", "备注", "标签"])
+        for row in rows:
+            contacts.append_values(row)
+        return contacts
+    
+    def sync_contacts(self, quick=False):
+        """
+        将好友列表同步到本地目录，返回与上一次同步相比的变化
+        Args:
+            quick: 是否快速同步。扫描到与目录一致的部分时立即停止，不会检测删除的好友
+        Return:
+            contact_store.SyncDiff
+        """
+        return self.contact_store.sync("contact", self.iter_contacts(), quick)
+    
+    def sync_groups(self, quick=False):
+        """
+        将群聊列表同步到本地目录，返回与上一次同步相比的变化
+        Args:
+            quick: 是否快速同步。扫描到与目录一致的部分时立即停止，不会检测退出的群聊
+        Return:
+            contact_store.SyncDiff
+        """
+        return self.contact_store.sync("group", self.iter_groups(), quick)
+
+    # 逐个产生通讯录中的联系人 (昵称, 备注, 标签)，读到即产生，已经产生过的昵称不再重复
+    def iter_contacts(self):
         self.open_wechat()
         self.get_wechat()
         
         # 获取通讯录管理界面
-        click(auto.ButtonControl(Name=self.lc.contacts))
-        list_control = auto.ListControl(Name=self.lc.contact)
+        self.backend.click(self.locate("contacts"))
+        list_control = self.locate("contact")
         # scroll_pattern = list_control.GetScrollPattern()
         # scroll_pattern.SetScrollPercent(-1, 0)
         contacts_menu = list_control.ButtonControl(Name=self.lc.manage_contacts)
-        click(contacts_menu)
+        self.backend.click(contacts_menu)
         
         # 切换到通讯录管理界面
-        contacts_window = auto.GetForegroundControl()
+        contacts_window = self.backend.get_foreground()
         list_control = contacts_window.ListControl()
-        scroll_pattern = list_control.GetScrollPattern()
         
-        # 读取用户
-        contacts = pandas_utils.DataFrame(columns=["昵称", "备注", "标签"])
-        # 如果不存在滑轮则直接读取
-        if scroll_pattern is None:
-            for contact in contacts_window.ListControl().GetChildren():
-                # 获取用户的昵称备注以及标签
-                name = contact.TextControl().Name
-                note = contact.ButtonControl(foundIndex=2).Name
-                label = contact.ButtonControl(foundIndex=3).Name
-
-                contacts = contacts._append({"昵称": name, "备注": note, "标签": label}, ignore_index=True)
-        else:
-            for percent in numpy_utils.arange(0, 1.001, 0.001):
-                scroll_pattern.SetScrollPercent(-1, percent)
-                for contact in contacts_window.ListControl().GetChildren():
-                    # 获取用户的昵称备注以及标签
-                    name = contact.TextControl().Name
-                    note = contact.ButtonControl(foundIndex=2).Name
-                    label = contact.ButtonControl(foundIndex=3).Name
-
-                    contacts = contacts._append({"昵称": name, "备注": note, "标签": label}, ignore_index=True)
-
-        # 对用户根据昵称进行去重
-        contacts = contacts.drop_duplicates(subset=["昵称"])
-        return contacts
+        # 逐页滚动读取用户（没有滚动条时直接读取），并根据昵称进行去重
+        seen = set()
+        for row in scan_list(list_control, self._read_contact_row,
+                             read_children=lambda: self.backend.snapshot(list_control).GetChildren()):
+            if row[0] not in seen:
+                seen.add(row[0])
+                yield row
+
+    # 读取通讯录管理界面中一行用户的昵称、备注以及标签
+    @staticmethod
+    def _read_contact_row(contact):
+        name = contact.TextControl().Name
+        note = contact.ButtonControl(foundIndex=2).Name
+        label = contact.ButtonControl(foundIndex=3).Name
+        return name, note, label
+
+    # 读取通讯录管理界面中一行群聊的名称 (将所有的顿号替换成了空格，这样才能在搜索框搜索到)
+    @staticmethod
+    def _read_group_row(contact):
+        return contact.TextControl().Name.replace("、", " ")
 
     # 获取所有群聊
     def find_all_groups(self):
+        rows = self.iter_groups()
+        if self.contact_store is not None:
+            rows = self.contact_store.sync_iter("group", rows)
+        return list(rows)
+
+    # 逐个产生群聊的名称，读到即产生，已经产生过的名称不再重复
+    def iter_groups(self):
         self.open_wechat()
         self.get_wechat()
         
         # 获取通讯录管理界面
-        time.sleep(0.3)
-        click(auto.ButtonControl(Name=self.lc.contacts))
-        list_control = auto.ListControl(Name=self.lc.contact)
+        self.backend.sleep(0.3)
+        self.backend.click(self.locate("contacts"))
+        list_control = self.locate("contact")
         scroll_pattern = list_control.GetScrollPattern()
         scroll_pattern.SetScrollPercent(-1, 0)
         contacts_menu = list_control.ButtonControl(Name=self.lc.manage_contacts)
-        click(contacts_menu)
+        self.backend.click(contacts_menu)
 
         # 切换到通讯录管理界面
-        contacts_window = auto.GetForegroundControl()
+        contacts_window = self.backend.get_foreground()
         
         # 点击最近群聊
-        click(contacts_window.ButtonControl(Name="最近群聊"))
+        self.backend.click(contacts_window.ButtonControl(Name="最近群聊"))
         
-        # 获取群聊列表
+        # 逐页滚动读取群聊（没有滚动条时直接读取），并进行去重
         list_control = contacts_window.ListControl()
-        scroll_pattern = list_control.GetScrollPattern()
-        
-        # 读取群聊
-        contacts = []
-        # 如果不存在滑轮则直接读取
-        if scroll_pattern is None:
-            for contact in contacts_window.ListControl().GetChildren():
-                # 获取群聊的名称 (将所有的顿号替换成了空格，这样才能在搜索框搜索到)
-                name = contact.TextControl().Name.replace("、", " ")
-                contacts.append(name)
-        else:
-            for percent in numpy_utils.arange(0, 1.002, 0.01):
-                scroll_pattern.SetScrollPercent(-1, percent)
-                for contact in contacts_window.ListControl().GetChildren():
-                    # 获取群聊的名称 (将所有的顿号替换成了空格，这样才能在搜索框搜索到)
-                    name = contact.TextControl().Name.replace("、", " ")
-                    contacts.append(name)
-        
-        # 返回去重过后的群聊
-        return list(set(contacts))
+        seen = set()
+        for name in scan_list(list_control, self._read_group_row,
+                              read_children=lambda: self.backend.snapshot(list_control).GetChildren()):
+            if name not in seen:
+                seen.add(name)
+                yield name
 
     # 检测微信是否收到新消息
     def check_new_msg(self):
@@ -276,56 +562,114 @@ class WeChat:
         self.get_wechat()
         
         # 获取左侧聊天按钮
-        chat_btn = auto.ButtonControl(Name=self.lc.chats)
-        double_click(chat_btn)
+        window = self.get_wechat()
+        chat_btn = self.locate("chats")
+        self.backend.double_click(chat_btn)
         
-        # 持续点击聊天按钮，直到获取完全部新消息
-        item = auto.ListItemControl(Depth=10)
-        prev_name = item.ButtonControl().Name
+        # 持续点击聊天按钮，直到获取完全部新消息。
+        # 会话的名称、预览和未读标记从快照中读取，点击和自动回复使用真实的控件
+        item = window.ListItemControl(Depth=9)
+        snapshot = self.backend.snapshot(item)
+        prev_name = snapshot.ButtonControl().Name
         
         while True:
             # 判断该联系人是否有新消息
-            pane_control = item.PaneControl()
-            if len(pane_control.GetChildren()) == 3:
-                print(f"{item.ButtonControl().Name} 有新消息")
+            children = snapshot.PaneControl().GetChildren()
+            if len(children) == 3:
+                name = snapshot.ButtonControl().Name
+                print(f"{name} 有新消息")
                 # 判断该联系人是否需要自动回复
-                if item.ButtonControl().Name in self.auto_reply_contacts:
-                    print(f"自动回复 {item.ButtonControl().Name}")
-                    self._auto_reply(item, self.auto_reply_msg)
+                reply = self._reply_for(name, children[1].GetLastChildControl().Name)
+                if reply is not None:
+                    print(f"自动回复 {name}")
+                    self._auto_reply(item, reply)
                 
-            click(item)
+            self._verify_before_switch(snapshot.ButtonControl().Name)
+            self.backend.click(item)
             
             # 跳转到下一个新消息
-            double_click(chat_btn)
-            item = auto.ListItemControl(Depth=10)
+            self.backend.double_click(chat_btn)
+            item = window.ListItemControl(Depth=9)
+            snapshot = self.backend.snapshot(item)
             
             # 已经完成遍历，退出循环
-            if prev_name == item.ButtonControl().Name:
+            if prev_name == snapshot.ButtonControl().Name:
                 break
             
-            prev_name = item.ButtonControl().Name
+            prev_name = snapshot.ButtonControl().Name
+    
+    def watch_sessions(self, callback=None, interval=0.3):
+        """
+        创建会话列表的新消息监视器。监视器只读取会话列表，不会点击或移动鼠标
+        Args:
+            callback: 收到新消息时调用 callback(event)，event 为 session_watcher.SessionEvent
+            interval: 读取会话列表的间隔（秒）
+        Return:
+            SessionWatcher，调用其 run() 开始监视（会阻塞，一般在子线程中运行），或者自行定时调用 poll()
+        """
+        self.open_wechat()
+        self.get_wechat()
+        return SessionWatcher(self.backend, lambda: self.locate("sessions"), callback, interval,
+                              get_current=self._foreground_chat, is_own=self._is_own_preview)
+    
+    # 前台显示的聊天名称，微信主窗口不在前台时（收到消息会增加未读数量）返回None
+    def _foreground_chat(self):
+        if self.backend.get_foreground().NativeWindowHandle != self._window_handle:
+            return None
+        return self.get_chat_title()
+    
+    # 判断会话的预览是否为最后一条发送到该聊天的消息（较长的消息在预览中会被截断）
+    def _is_own_preview(self, name, preview):
+        for record in reversed(self.send_records):
+            if record.chat == name:
+                prefix = preview.rstrip(".…")
+                return record.text == preview or (prefix != preview and record.text.startswith(prefix))
+        return False
     
     # 设置自动回复的联系人
-    def set_auto_reply(self, contacts):
-        # contacts是一个列表
+    def set_auto_reply(self, contacts, engine=None):
+        """
+        Args:
+            contacts: 使用默认回复内容（auto_reply_msg）自动回复的联系人列表
+            engine: 自动回复规则（auto_reply.AutoReplyEngine），设置后优先按规则回复
+        """
         self.auto_reply_contacts = contacts
+        if engine is not None:
+            self.auto_reply_engine = engine
+    
+    # 计算收到的消息的自动回复内容，不需要回复时返回None
+    def _reply_for(self, name, message):
+        if self.auto_reply_engine is not None:
+            rule, reply = self.auto_reply_engine.evaluate(name, message)
+            # 规则触发但因冷却时间或重复消息不回复时，也不再使用默认的回复内容
+            if rule is not None:
+                return reply
+        if name in self.auto_reply_contacts:
+            return self.auto_reply_msg
+        return None
+    
+    # 作为 watch_sessions 的回调函数，对监视到的新消息按规则自动回复
+    def auto_reply_event(self, event):
+        reply = self._reply_for(event.name, event.preview)
+        if reply is not None:
+            self.send_msg(event.name, reply)
     
     # 自动回复
     def _auto_reply(self, element, text):
-        click(element)
-        pyperclip.copy(text)
-        # self.step_paste_execute()
-        time.sleep(0.3)
-        auto.SendKeys("{Ctrl}v")
-        time.sleep(0.3)
-        self.press_enter()
+        name = element.ButtonControl().Name
+        self._verify_before_switch(name)
+        self.backend.click(element)
+        self.waiter.until(lambda: self.get_chat_title() == name, "chat_header")
+        self.current_chat = name
+        self._fill_and_send(text)
     
     # 识别聊天内容的类型
     # 0：用户发送    1：时间信息  2：红包信息  3：”查看更多消息“标志 4：撤回消息
-    def _detect_type(self, list_item_control: auto.ListItemControl) -> int:
+    def _detect_type(self, list_item_control) -> int:
         value = None
         # 判断内容框是否为时间框，如果是时间框则子控件不是PaneControl
-        if not isinstance(list_item_control.GetFirstChildControl(), auto.PaneControl):
+        first_child = list_item_control.GetFirstChildControl()
+        if first_child is None or first_child.ControlTypeName != "PaneControl":
             value = 1
         
         else:
@@ -358,64 +702,70 @@ class WeChat:
     # 获取聊天窗口
     def _get_chat_frame(self, name: str):
         self.get_contact(name)
-        return auto.ListControl(Name=self.lc.message)
+        return self.locate("message")
     
-    def save_dialog_pictures(self, name: str, num: int, save_dir: str) -> None:
+    def save_dialog_pictures(self, name: str, num: int, save_dir: str, workers: int = 4) -> dict:
         """
         保存指定聊天记录中的图片。图片的名字代表图片在聊天记录中的顺序，从1开始代表最新的图片。
+        界面上只负责逐个复制图片获取文件路径，文件由后台线程复制，并记录在保存目录的清单中（见 media_export.py），
+        重新运行时已经导出过的图片不再右键复制。聊天中有了新图片后重新运行时，序号已经被之前导出的其他图片占用的
+        图片保存为 <序号>_<SHA-256 的前8位>.jpg。
         Args:
             name: 聊天窗口的名字
             num: 保存的最大数量（从最新图片开始保存）
             save_dir: 保存的目录
+            workers: 复制文件的线程数量
+        Return:
+            stats: 新复制、已导出过而跳过、内容重复以及复制失败的文件数量
         """
         
         # 进入图片聊天记录界面
         self.get_contact(name)
-        click(auto.ButtonControl(Name=self.lc.chat_history, Depth=14))
-        click(auto.TabItemControl(Name=self.lc.photos_n_videos, Depth=6))
+        root = self.backend.get_root()
+        self.backend.click(self.locate("chat_history"))
+        self.backend.click(root.TabItemControl(Name=self.lc.photos_n_videos, Depth=6))
         
         # 图片栏控件
-        list_control = auto.ListControl(Name=self.lc.photos_n_videos, Depth=6)
+        list_control = root.ListControl(Name=self.lc.photos_n_videos, Depth=6)
         
         # 如果图片数量 < num，则继续往上翻直到满足条件或无法上翻为止
-        move(list_control.GetLastChildControl())
-        pictures = set()
-        cnt = 0
-        while cnt < num:
-            ori_cnt = cnt
-            for list_item_control in list_control.GetChildren()[::-1]:
-                # 如果标签不是图片则跳过
-                if len(list_item_control.GetFirstChildControl().GetChildren()) == 3:
-                    continue
-                
-                if cnt < num:
-                    # 复制图片到剪切板
-                    right_click(list_item_control)
-                    menu = auto.ListControl(Depth=4)
-                    copy = menu.GetFirstChildControl()
-                    # 如果图片已经被清理则跳过
-                    if copy.Name != self.lc.copy:
+        self.backend.move(list_control.GetLastChildControl())
+        # 退出 with 时等待所有图片复制完成
+        with MediaExporter(save_dir, workers) as exporter:
+            cnt = 0
+            while cnt < num:
+                ori_cnt = cnt
+                for list_item_control in list_control.GetChildren()[::-1]:
+                    # 如果标签不是图片则跳过
+                    if len(list_item_control.GetFirstChildControl().GetChildren()) == 3:
                         continue
-                    else:
-                        click(auto.MenuItemControl(Name=self.lc.copy, Depth=5))
-                    
-                    # 获取图片路径防止重复存储
-                    pic_hash = ImageGrab.grabclipboard()[0]
+                
+                    if cnt < num:
+                        # 清单中记录过同一序号的同名条目时不再右键复制
+                        if exporter.exported_row(list_item_control.Name, cnt + 1):
+                            cnt += 1
+                            continue
 
-                    # 获取后缀
-                    suffix = pic_hash.split(".")[-1]
+                        # 复制图片到剪切板
+                        self.backend.right_click(list_item_control)
+                        menu = root.ListControl(Depth=4)
+                        copy = menu.GetFirstChildControl()
+                        # 如果图片已经被清理则跳过
+                        if copy.Name != self.lc.copy:
+                            continue
+                        else:
+                            self.backend.click(root.MenuItemControl(Name=self.lc.copy, Depth=5))
                     
-                    # 保存图片
-                    if pic_hash not in pictures:
-                        cnt += 1
-                        pictures.add(pic_hash)
-                        save_path = os.path.join(save_dir, f"{cnt}.{suffix}")
-                        os.system(f"copy \"{pic_hash}\" \"{save_path}\"")
-            # 上滑
-            pyautogui.scroll(300)
-            # 如果无法上滑则退出
-            if ori_cnt == cnt:
-                break
+                        # 获取图片路径，交给后台线程保存（同一张图片只提交一次）
+                        files = self.backend.get_clipboard_files()
+                        if files and exporter.submit(files[0], cnt + 1, list_item_control.Name):
+                            cnt += 1
+                # 上滑
+                self.backend.scroll(300)
+                # 如果无法上滑则退出
+                if ori_cnt == cnt:
+                    break
+        return exporter.stats
             
     # 获取指定聊天窗口的聊天记录
     def get_dialogs(self, name: str, n_msg: int,search_user: bool = True) -> List:
@@ -428,44 +778,172 @@ class WeChat:
         Return:
             dialogs: 聊天记录列表，内部元素为三元组（信息类型，发送人，发送内容）
         """
+        # 从下往上逐页读取，读够 n_msg 条即停止，然后将聊天记录列表翻转
+        dialogs = list(itertools.islice(self.iter_dialogs(name, search_user), n_msg))
+        return dialogs[::-1]
+
+    def iter_dialogs(self, name: str, search_user: bool = True):
+        """
+        从最新的消息开始往前逐条产生聊天记录。只在需要更早的消息时才向上滚动或点击“查看更多消息”，
+        消息列表只为可见的消息创建控件时也能读到全部消息
+        Args:
+            name: 聊天窗口的姓名
+            search_user: 是否需要搜索用户
+        Return:
+            生成器，依次产生三元组（信息类型，发送人，发送内容），不包括“查看更多消息”标志
+        """
         if search_user:
             list_control = self._get_chat_frame(name)
         else:
-            list_control = auto.ListControl(Name=self.lc.message)
-        scroll_pattern = list_control.GetScrollPattern()
+            list_control = self.locate("message")
+        for v, sender, msg in self._iter_dialog_items(list_control):
+            yield self.DIALOG_TYPES[v], sender, msg
 
-        # 如果聊天记录数量 < n_msg，则继续往上翻直到满足条件或无法上翻为止
-        while len(list_control.GetChildren()) < n_msg:
-            # 如果滑轮存在，将聊天记录翻到“查看更多消息”
-            if scroll_pattern:
-                scroll_pattern.SetScrollPercent(-1, 0)
-            # 如果无法上翻则退出
-            first_item = list_control.GetFirstChildControl()
-            if self._detect_type(first_item) != 3:
-                break
-            # 否则点击“查看更多消息”
-            else:
-                click(first_item)
+    def _iter_dialog_items(self, list_control):
+        # 从新到旧依次产生 (类型编号, 发送人, 内容)。每一页在快照上解析，点击“查看更多消息”时使用真实的控件
+        def key(item):
+            v = self._detect_type(item)
+            return v, item.ButtonControl().Name if v == 0 else '', item.Name
 
-        cnt = 0
-        dialogs = []
-        value_to_info = {0: '用户发送', 1: '时间信息', 2: '红包信息', 3: '"查看更多消息"标志', 4: '撤回消息', 5: "System Notification", 6: '"以下是新消息"标志'}
-        # 从下往上依次记录聊天内容。
-        for list_item_control in list_control.GetChildren()[::-1]:
-            v = self._detect_type(list_item_control)
-            msg = list_item_control.Name
-            name = list_item_control.ButtonControl().Name if v == 0 else ''
-            
-            cnt += 1
-            dialogs.append((value_to_info[v], name, msg))
-            
-            # 如果达到n_msg则退出
-            if cnt == n_msg:
-                break
-        
-        # 将聊天记录列表翻转
-        dialogs = dialogs[::-1]
-        return dialogs
+        return scan_list_upward(
+            list_control, key,
+            is_more=lambda item: self._detect_type(item) == 3,
+            load_more=lambda: self.backend.click(list_control.GetFirstChildControl()),
+            read_children=lambda: self.backend.snapshot(list_control).GetChildren())
+
+    def get_new_dialogs(self, name: str, search_user: bool = True, n_msg: int = 0, max_msg: int = 500) -> List:
+        """
+        增量获取聊天记录：只返回上一次调用之后新出现的消息。
+        每个聊天记录一个游标，即上一次读到的最后一条消息的指纹（所在时间分块、在分块中的位置、类型、发送人、内容）。
+        从最新的消息往上读，读到游标所在的时间分块即停止；游标不在已加载的消息中时才点击“查看更多消息”。
+        Args:
+            name: 聊天窗口的姓名
+            search_user: 是否需要搜索用户
+            n_msg: 第一次调用（没有游标）时返回最后多少条消息，为0时只记录游标
+            max_msg: 找不到游标时最多返回的消息数量
+        Return:
+            dialogs: 聊天记录列表，内部元素为三元组（信息类型，发送人，发送内容），不包括“查看更多消息”和“以下是新消息”标志
+        """
+        return [dialog for _, dialog in self.get_new_dialog_entries(name, search_user, n_msg, max_msg)]
+
+    def get_new_dialog_entries(self, name: str, search_user: bool = True, n_msg: int = 0, max_msg: int = 500) -> List:
+        """
+        与 get_new_dialogs 相同，但同时返回每条消息的指纹
+        Return:
+            entries: (指纹, 三元组) 列表，按时间顺序排列
+        """
+        last, entries = self._dialog_entries_after(name, self.dialog_cursors.get(name), search_user, n_msg, max_msg)
+        if last is not None:
+            self.dialog_cursors[name] = last
+        return entries
+    
+    def _dialog_entries_after(self, name, cursor, search_user, n_msg, max_msg):
+        """
+        读取游标之后的新消息，不更新任何游标
+        Args:
+            cursor: 上一次读到的最后一条消息的指纹，为空时只读取最新的 n_msg 条
+        Return:
+            (新的游标, 新消息)。新的游标为读到的最后一条消息的指纹，没有新消息时为None；
+            新消息为 (指纹, 三元组) 列表，按时间顺序排列。没有游标时新消息只包括最新的 n_msg 条，但游标仍然指向最后一条消息
+        """
+        if search_user:
+            list_control = self._get_chat_frame(name)
+        else:
+            list_control = self.locate("message")
+        limit = n_msg if cursor is None else max_msg
+        found, entries = self._read_dialogs_after(list_control, cursor, limit)
+        last = entries[-1][0] if entries else None
+        if not found:
+            entries = entries[-limit:] if limit > 0 else []
+        return last, entries
+
+    def archive_chats(self, names, max_msg: int = 500) -> dict:
+        """
+        把聊天中尚未归档的消息追加到本地归档（self.chat_archive）中。
+        游标保存在归档中，与 get_new_dialogs 的游标（self.dialog_cursors）相互独立，
+        已经被 get_new_dialogs 读过的消息仍然会归档。重新启动程序后也只读取上一次归档之后的新消息
+        Args:
+            names: 聊天名称列表
+            max_msg: 每个聊天最多读取的消息数量（第一次归档或找不到游标时）
+        Return:
+            聊天名称 -> 本次读取到的新消息数量
+        """
+        archive = self.chat_archive
+        counts = {}
+        for name in names:
+            _, entries = self._dialog_entries_after(name, archive.cursor(name), True, max_msg, max_msg)
+            archive.add(name, entries)
+            counts[name] = len(entries)
+        archive.flush()
+        if self.chat_search is not None:
+            self.chat_search.update()
+        return counts
+
+    def search_chats(self, query: str, name: str = None, sender: str = None, msg_type=None,
+                     since: float = None, until: float = None, limit: int = 20) -> List:
+        """
+        在已归档的聊天记录中搜索，不需要打开微信
+        Args:
+            query: 查询文本，多个词用空格分隔，消息需要包含所有的词
+            name: 只搜索该聊天
+            sender: 只搜索该发送人的消息
+            msg_type: 只搜索该类型的消息，可以是 _detect_type 的返回值或者 DIALOG_TYPES 中的类型名称
+            since: 只搜索时间分块不早于该时间（时间戳或 datetime）的消息，按消息所在时间分块的时间信息过滤
+            until: 只搜索时间分块早于该时间的消息
+            limit: 最多返回的结果数量
+        Return:
+            results: 按相关度排列的列表，内部元素为 (编号, 聊天, 发送人, 类型, 内容, 时间分块, 归档时间)
+        """
+        if isinstance(msg_type, int):
+            msg_type = self.DIALOG_TYPES[msg_type]
+        self.chat_search.update()
+        return self.chat_search.search(query, name, sender, msg_type, since, until, limit)
+
+    def _read_dialogs_after(self, list_control, cursor, limit):
+        """
+        从下往上按时间分块读取消息，直到找到游标或者读够 limit 条
+        Return:
+            (是否找到游标, 游标之后的 (指纹, 三元组) 列表（按时间顺序）)
+        """
+        entries = []
+        # 尚未遇到时间信息的消息（从下往上）
+        pending = []
+        for v, sender, msg in self._iter_dialog_items(list_control):
+            # “以下是新消息”标志会随界面状态出现或消失，不计入指纹
+            if v == 6:
+                continue
+            pending.append((v, sender, msg))
+            if v != 1:
+                continue
+
+            # 遇到时间信息，该时间分块的消息已经完整
+            block = self._fingerprint_block(msg, pending[::-1])
+            pending = []
+            for i, (fingerprint, _) in enumerate(block):
+                if fingerprint == cursor:
+                    return True, block[i + 1:] + entries
+            entries = block + entries
+            if len(entries) >= limit:
+                return False, entries
+
+        # 已经读到最上方，剩余的消息所在的时间分块未知
+        if pending:
+            block = self._fingerprint_block(None, pending[::-1])
+            for i, (fingerprint, _) in enumerate(block):
+                if fingerprint == cursor:
+                    return True, block[i + 1:] + entries
+            entries = block + entries
+        return False, entries
+
+    def _fingerprint_block(self, block, items):
+        # 时间分块内每条消息的指纹为 (时间分块, 在分块中的位置, 类型, 发送人, 内容)。
+        # 时间信息的文本会随日期变化（如 "12:30" 第二天变为 "昨天 12:30"），因此时间分块使用换算后的绝对时间
+        if block is not None:
+            timestamp = parse_time_separator(block)
+            if timestamp is not None:
+                block = timestamp.strftime("%Y-%m-%d %H:%M")
+        return [((block, i, v, sender, content), (self.DIALOG_TYPES[v], sender, content))
+                for i, (v, sender, content) in enumerate(items)]
 
     def get_dialogs_by_time_blocks(self, name: str, n_time_blocks: int, search_user: bool = True) -> List[List]:
         """
@@ -477,54 +955,57 @@ class WeChat:
         Return:
             groups: 聊天记录列表，每个元素为一个时间分块内的消息列表
         """
-        n_msg = n_time_blocks * 5
-        prev_dialogs = None
+        # 从最新的消息往上逐条读取并分组，凑够指定数量的时间分块即停止。
+        # groups 按从新到旧的顺序保存已经完整的时间分块，current 保存尚未遇到时间信息的消息（从下往上）
         groups = []
-        while True:
-            dialogs = self.get_dialogs(name, n_msg, search_user)
+        current = []
+        for dialog in self.iter_dialogs(name, search_user):
+            current.append(dialog)
+            # 遇见时间信息则完成一个分组
+            if dialog[0] == self.DIALOG_TYPES[1]:
+                groups.append(current[::-1])
+                current = []
+                if len(groups) >= n_time_blocks:
+                    break
+        # 最上方不属于任何时间分块的消息被忽略
+        return groups[::-1]
 
-            # 如果获取的dialogs和之前一样，说明没有更多消息了，退出循环
-            if prev_dialogs == dialogs:
-                break
-            # 分组逻辑调整：处理顺序改为从最新消息到最早消息
-            groups = []
-            current_group = None
-
-            # 遍历所有消息，按照时间信息分组
-            for msg in dialogs:
-                # 遇见时间信息则新建一个分组
-                if msg[0] == '时间信息':
-                    # 将上一个分组加入到groups中
-                    if current_group is not None:
-                        groups.append(current_group)
-
-                    # 初始化新的分组
-                    current_group = [msg]
-
-                elif current_group is not None:
-                    current_group.append(msg)
-
-            # 将最后一个分组加入到groups中
-            if current_group is not None:
-                groups.append(current_group)
-
-            # 获取n_time_blocks个时间块，取groups的最后n_time_blocks个元素
-            if len(groups) >= n_time_blocks:
-                groups = groups[-n_time_blocks:]
+    def get_dialogs_since(self, since: datetime.datetime, name: str, search_user: bool = True) -> List:
+        """
+        获取指定时间之后的聊天记录。从最新的消息往上逐条读取，读到早于 since 的时间信息即停止，
+        不会加载更早的消息。
+        Args:
+            since: 开始时间
+            name: 聊天窗口的姓名
+            search_user: 是否需要搜索用户
+        Return:
+            dialogs: 聊天记录列表，内部元素为四元组（时间，信息类型，发送人，发送内容），按时间顺序排列。
+                时间为消息所在时间分块的时间信息换算成的 datetime（近似时间），无法识别时为None。
+                时间分块内的消息可能持续到下一个时间信息之前，因此包括时间早于 since、但其中的消息可能晚于 since 的那一个分块
+        """
+        now = datetime.datetime.now()
+        # dialogs 按从新到旧的顺序保存已经确定时间的消息，current 保存尚未遇到时间信息的消息（从下往上）
+        dialogs = []
+        current = []
+        for dialog in self.iter_dialogs(name, search_user):
+            current.append(dialog)
+            if dialog[0] != self.DIALOG_TYPES[1]:
+                continue
+            # 遇见时间信息，该分块内的消息都标记为这个时间
+            timestamp = parse_time_separator(dialog[2], now)
+            dialogs.extend((timestamp, *item) for item in current)
+            current = []
+            if timestamp is not None and timestamp < since:
                 break
-            else:
-                prev_dialogs = dialogs
-                n_msg *= 2
-                search_user = False  # 后续不需要再次搜索用户
-
-        return groups
+        # 最上方不属于任何时间分块的消息被忽略
+        return dialogs[::-1]
 
     def step_paste_execute(self):
         """
         分步骤粘贴消息在聊天窗口
         """
         # 获取发送按钮
-        send_button = auto.ButtonControl(Depth=15, Name=self.lc.send)
+        send_button = self.locate("send")
         
         # 获取按钮位置
         x, y = send_button.GetPosition()
@@ -534,12 +1015,12 @@ class WeChat:
         offset_y = y - 50
         
         # 等待粘贴
-        time.sleep(1.0)
+        self.backend.sleep(1.0)
         # 右键偏移后的位置
-        auto.RightClick(offset_x, offset_y)
-        time.sleep(0.5)
-        paste_button = auto.TextControl(Depth=7, Name="粘贴")
-        click(paste_button)
+        self.backend.right_click_at(offset_x, offset_y)
+        self.backend.sleep(0.5)
+        paste_button = self.backend.get_root().TextControl(Depth=7, Name="粘贴")
+        self.backend.click(paste_button)
 
 if __name__ == '__main__':
     # 测试
@@ -0,0 +1,109 @@
+"""
+微信自动化后端接口。
+WeChat 类不直接调用 uiautomation、pyperclip、pyautogui 等库，而是通过后端对象访问控件树、鼠标键盘和剪切板。
+这样既可以使用真实的 Windows 桌面（UIAutomationBackend），也可以使用内存中的模拟微信（SimulatedWeChat）在无桌面的环境下运行。
+
+后端返回的控件对象需要提供 uiautomation.Control 的常用子集：
+    Name、ControlTypeName、ClassName、NativeWindowHandle、BoundingRectangle、
+    GetChildren()、GetFirstChildControl()、GetLastChildControl()、GetParentControl()、GetPosition()、
+    按类型搜索后代控件（如 ButtonControl(Name=..., Depth=..., foundIndex=...)）、GetScrollPattern()、GetValuePattern()。
+"""
+import time
+
+from wechat_snapshot import build_snapshot
+
+
+class WeChatBackend:
+    # 获取桌面根控件，所有控件搜索都从这里开始
+    def get_root(self):
+        raise NotImplementedError
+
+    # 获取当前前台窗口控件
+    def get_foreground(self):
+        raise NotImplementedError
+
+    # 判断窗口句柄是否仍然有效
+    def is_window(self, handle):
+        raise NotImplementedError
+
+    # 按窗口类名查找顶层窗口，返回窗口句柄，找不到时返回0
+    def find_window(self, class_name):
+        raise NotImplementedError
+
+    # 将窗口恢复并激活到前台
+    def activate_window(self, handle):
+        raise NotImplementedError
+
+    # 根据窗口句柄获取窗口控件
+    def control_from_handle(self, handle):
+        raise NotImplementedError
+
+    # 启动指定路径的程序
+    def launch(self, path):
+        raise NotImplementedError
+
+    # 鼠标移动到控件上
+    def move(self, control):
+        raise NotImplementedError
+
+    # 鼠标点击控件
+    def click(self, control):
+        raise NotImplementedError
+
+    # 鼠标右键点击控件
+    def right_click(self, control):
+        raise NotImplementedError
+
+    # 鼠标右键点击屏幕坐标
+    def right_click_at(self, x, y):
+        raise NotImplementedError
+
+    # 鼠标双击控件
+    def double_click(self, control):
+        raise NotImplementedError
+
+    # 发送按键。control 为空时发送给当前焦点控件
+    def send_keys(self, keys, control=None):
+        raise NotImplementedError
+
+    # 鼠标滚轮滚动，正数为向上
+    def scroll(self, clicks):
+        raise NotImplementedError
+
+    # 读取输入框等控件的文本内容
+    def get_value(self, control):
+        raise NotImplementedError
+
+    # 直接设置输入框等控件的文本内容（不经过剪切板），控件不支持时返回False
+    def set_value(self, control, text):
+        raise NotImplementedError
+
+    # 复制文本到剪切板
+    def copy_text(self, text):
+        raise NotImplementedError
+
+    # 复制文件到剪切板
+    def copy_files(self, paths):
+        raise NotImplementedError
+
+    # 读取剪切板中的文件路径列表，没有文件时返回None
+    def get_clipboard_files(self):
+        raise NotImplementedError
+
+    # 订阅控件及其子控件的结构或属性变化，变化时调用 callback()。
+    # 返回取消订阅的函数；后端不支持变化事件时返回None，调用方应改为定时读取
+    def subscribe_changes(self, control, callback):
+        return None
+
+    # 一次性读取控件子树的名称、类型、类名和位置，返回只读的 SnapshotNode 树（见 wechat_snapshot.py）。
+    # 默认逐个控件读取，支持批量读取的后端应覆盖此方法
+    def snapshot(self, control):
+        return build_snapshot(control)
+
+    # 等待一段时间。模拟后端可以用虚拟时钟代替真实等待
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    # 单调时钟的当前时间（秒），用于计算等待时长
+    def now(self):
+        return time.monotonic()
@@ -1,6 +1,5 @@
 import sys
 import time
-import itertools
 import configparser
 import os
 import json
@@ -13,6 +12,9 @@ from module import *
 from wechat_locale import WeChatLocale
 from style import AppTheme, create_title_label, create_group_box, create_tab_group_box, create_primary_button, create_secondary_button, create_warning_button, create_danger_button, apply_material_stylesheet
 from message_sender import MessageSenderThread
+from scheduler import Scheduler, parse_schedule
+from contact_store import ContactStore
+from tag_index import TagIndex
 
 
 class WechatGUI(QWidget):
@@ -20,6 +22,8 @@ class WechatGUI(QWidget):
     def __init__(self):
         super().__init__()
         self.wechat = WeChat(None)
+        # 每次导出好友、群聊时同步到本地目录，记录新增、变化和删除
+        self.wechat.contact_store = ContactStore("contacts.db")
         self.clock = ClockThread()
         self.message_sender = MessageSenderThread()
 
@@ -49,21 +53,52 @@ class WechatGUI(QWidget):
     def init_choose_contacts(self):
         # 读取联系人列表并保存
         def save_contacts():
-            path = QFileDialog.getSaveFileName(self, "保存联系人列表", "contacts.csv", "表格文件(*.csv)")[0]
+            path = QFileDialog.getSaveFileName(self, "保存联系人列表", "contacts.csv",
+                                               "表格文件(*.csv);;JSON Lines(*.jsonl)")[0]
             if not path == "":
-                contacts = self.wechat.find_all_contacts()
-                contacts.to_csv(path, index=False, encoding='utf_8_sig')
-                QMessageBox.information(self, "保存成功", "联系人列表保存成功！")
+                export(lambda: self.wechat.contact_store.sync_iter("contact", self.wechat.iter_contacts()),
+                       path, ["昵称", "备注", "标签"], "联系人列表")
         
         # 保存群聊列表
         def save_groups():
-            path = QFileDialog.getSaveFileName(self, "保存群聊列表", "groups.txt", "文本文件(*.txt)")[0]
+            path = QFileDialog.getSaveFileName(self, "保存群聊列表", "groups.txt",
+                                               "文本文件(*.txt);;JSON Lines(*.jsonl)")[0]
             if not path == "":
-                contacts = self.wechat.find_all_groups()
-                with open(path, 'w', encoding='utf-8') as f:
-                    for contact in contacts:
-                        f.write(contact + '\n')
-                QMessageBox.information(self, "保存成功", "群聊列表保存成功！")
+                export(lambda: self.wechat.contact_store.sync_iter("group", self.wechat.iter_groups()),
+                       path, ["群聊"], "群聊列表")
+        
+        # 在子线程中边读取边写入文件，并显示导出进度
+        def export(rows_func, path, columns, desc):
+            progress = QProgressDialog(f"正在导出{desc}...", "取消", 0, 0, self)
+            progress.setWindowTitle("导出")
+            progress.setWindowModality(Qt.WindowModality.WindowModal)
+
+            thread = ExportThread(rows_func, path, columns)
+            thread.progress.connect(lambda count: progress.setLabelText(f"正在导出{desc}，已导出 {count} 条..."))
+            progress.canceled.connect(thread.stop)
+
+            def on_finished(count):
+                progress.close()
+                diff = self.wechat.contact_store.last_result
+                QMessageBox.information(self, "保存成功", f"{desc}保存成功！共 {count} 条。\n"
+                                        f"与上次相比：新增 {len(diff.added) + len(diff.restored)} 条，"
+                                        f"变化 {len(diff.changed)} 条，删除 {len(diff.removed)} 条。")
+
+            def on_cancelled(count):
+                progress.close()
+                QMessageBox.information(self, "已取消", f"已取消导出{desc}，取消前导出的 {count} 条已保存到文件中。")
+
+            def on_error(msg, count):
+                progress.close()
+                QMessageBox.warning(self, "保存失败", f"导出{desc}时出错：{msg}\n已导出的 {count} 条已保存到文件中。")
+
+            thread.finished_export.connect(on_finished)
+            thread.cancelled.connect(on_cancelled)
+            thread.error.connect(on_error)
+            # 保存引用，防止线程对象在运行时被回收
+            self.export_thread = thread
+            thread.start()
+            progress.show()
         
         # 从 config.json 中加载联系人列表
         def load_contacts():
@@ -96,6 +131,32 @@ class WechatGUI(QWidget):
                     id = f"{self.contacts_view.count() + 1}"
                     self.contacts_view.addItem(f"{id}:{str(name).strip()}")
 
+        # 按标签查询好友并添加到用户列表
+        def add_contacts_by_tag():
+            index = TagIndex.from_store(self.wechat.contact_store)
+            if len(index) == 0:
+                QMessageBox.warning(self, "添加失败", "本地还没有好友目录，请先点击“保存微信好友列表”！")
+                return
+
+            tags = "、".join(f"{tag}({count})" for tag, count in sorted(index.tags().items()))
+            query, ok = QInputDialog.getText(self, '按标签添加', f'输入标签查询，空格表示同时满足，可以使用 OR、NOT 和括号'
+                                                               f'(例：(客户 OR 供应商) NOT 黑名单)\n现有标签：{tags}')
+            if not ok or query == "":
+                return
+
+            try:
+                names = index.query(query)
+            except ValueError as e:
+                QMessageBox.warning(self, "添加失败", f"查询格式错误：{e}")
+                return
+
+            # 跳过已经在列表中的用户
+            existing = {self.contacts_view.item(i).text().split(':', 1)[1] for i in range(self.contacts_view.count())}
+            names = [name for name in names if name not in existing]
+            for name in names:
+                self.contacts_view.addItem(f"{self.contacts_view.count() + 1}:{name}")
+            QMessageBox.information(self, "添加成功", f"已添加 {len(names)} 个用户。")
+
         # 删除用户信息
         def del_contact():
             # 删除选中的用户
@@ -162,11 +223,15 @@ class WechatGUI(QWidget):
         add_btn = create_secondary_button("添加用户")
         add_btn.clicked.connect(add_contact)
         
+        add_tag_btn = create_secondary_button("按标签添加")
+        add_tag_btn.clicked.connect(add_contacts_by_tag)
+        
         del_btn = create_danger_button("删除选中用户")
         del_btn.clicked.connect(del_contact)
         
         contact_actions_layout.addWidget(load_btn)
         contact_actions_layout.addWidget(add_btn)
+        contact_actions_layout.addWidget(add_tag_btn)
         contact_actions_layout.addWidget(del_btn)
         contact_actions_group.setLayout(contact_actions_layout)
         
@@ -196,11 +261,14 @@ class WechatGUI(QWidget):
         # 按钮响应：增加时间
         def add_contact():
             inputs = [
-                "注：在每一个时间输入框内都可以使用英文逗号\",\"来一次性区分多个数值进行多次定时。\n(例：分钟框输入 10,20,30,40)",
+                "注：每一个时间输入框内都可以使用英文逗号\",\"填写多个数值（例：分钟框输入 10,20,30,40），\n"
+                "使用\"-\"填写范围（例：小时框输入 9-18），使用\"/\"填写间隔（例：分钟框输入 */10），\"*\"表示不限。\n"
+                "年 (例：2026，*)",
                 "月 (1~12)",
                 "日 (1~31)",
                 "小时（0~23）",
                 "分钟 (0~59)",
+                "星期 (1~7，*为不限)",
                 "发送信息的起点（从哪一条开始发）",
                 "发送信息的终点（到哪一条结束，包括该条）",
             ]
@@ -213,27 +281,30 @@ class WechatGUI(QWidget):
                 str(local_time.tm_mday),
                 str(local_time.tm_hour),
                 str(local_time.tm_min),
+                "*",
                 "",
                 "",
             ]
 
             dialog = MultiInputDialog(inputs, default_values)
             if dialog.exec() == QDialog.DialogCode.Accepted:
-                year, month, day, hour, min, st, ed = dialog.get_input()
+                year, month, day, hour, min, weekday, st, ed = dialog.get_input()
                 if year == "" or month == "" or day == "" or hour == "" or min == "" or st == "" or ed == "":
                     QMessageBox.warning(self, "输入错误", "输入不能为空！")
                     return
-                
+
+                # 多个数值、范围和间隔都保存为一条周期规则，不再展开成多条定时
+                if weekday in ("", "*"):
+                    input = f"{year} {month} {day} {hour} {min} {st}-{ed}"
                 else:
-                    year_list = year.split(',')
-                    month_list = month.split(',')
-                    day_list = day.split(',')
-                    hour_list = hour.split(',')
-                    min_list = min.split(',')
-                    
-                    for year, month, day, hour, min in itertools.product(year_list, month_list, day_list, hour_list, min_list):
-                        input = f"{year} {month} {day} {hour} {min} {st}-{ed}"
-                        self.time_view.addItem(input)
+                    input = f"{year} {month} {day} {hour} {min} {weekday} {st}-{ed}"
+
+                try:
+                    parse_schedule(input)
+                except ValueError as e:
+                    QMessageBox.warning(self, "输入错误", f"定时格式错误：{e}")
+                    return
+                self.time_view.addItem(input)
 
         # 按钮响应：删除时间
         def del_contact():
@@ -252,8 +323,6 @@ class WechatGUI(QWidget):
 
             if self.clock.time_counting is True:
                 return
-            else:
-                self.clock.time_counting = True
 
             status_label.setStyleSheet(f"color: {AppTheme.DANGER}; font-weight: bold;")
             status_label.setText("定时发送（目前已开始）")
@@ -261,7 +330,7 @@ class WechatGUI(QWidget):
         
         # 按钮响应：结束定时
         def end_counting():
-            self.clock.time_counting = False
+            self.clock.stop()
             status_label.setStyleSheet(f"color: {AppTheme.TEXT_PRIMARY}; font-weight: normal;")
             status_label.setText("定时发送（目前未开始）")
         
@@ -420,13 +489,15 @@ class WechatGUI(QWidget):
         def send_msg(gap=None, st=None, ed=None):
             # 获取发送间隔
             interval = send_interval.spin_box.value()
+            per_minute = send_per_minute.spin_box.value()
             
             if self.msg.count() == 0:
                 QMessageBox.warning(self, "发送失败", "请先添加要发送的内容！")
                 return
 
             # 启动消息发送线程
-            self.message_sender.setup(self.wechat, self.contacts_view, self.msg, interval, st, ed)
+            self.message_sender.setup(self.wechat, self.contacts_view, self.msg, interval, st, ed,
+                                      per_minute=per_minute)
             self.message_sender.start()
 
         # 创建主布局
@@ -454,9 +525,14 @@ class WechatGUI(QWidget):
         control_layout = QHBoxLayout()
         
         # 发送间隔设置
-        send_interval = MySpinBox("发送间隔（秒）")
+        send_interval = MySpinBox("发送间隔（秒）", decimals=1)
         send_interval.spin_box.setValue(3)  # 默认值设为1秒
         control_layout.addWidget(send_interval, 2)
+
+        # 每分钟最多发送的消息数量
+        send_per_minute = MySpinBox("每分钟上限（0为不限）")
+        send_per_minute.spin_box.setRange(0, 999)
+        control_layout.addWidget(send_per_minute, 2)
         
         # 发送按钮
         send_btn = create_primary_button("发送消息")
@@ -779,7 +855,8 @@ class WechatGUI(QWidget):
         
         # 保存防止自动下线设置
         config['Settings'] = {
-            'prevent_offline': self.clock.prevent_offline
+            'prevent_offline': self.clock.prevent_offline,
+            'missed_policy': self.clock.scheduler.policy
         }
         
         # 写入配置文件
@@ -834,6 +911,10 @@ class WechatGUI(QWidget):
                 prevent_offline = config['Settings']['prevent_offline']
                 self.clock.prevent_offline = prevent_offline
                 self.prevent_offline_btn.setChecked(prevent_offline)
+
+            # 读取错过定时的处理方式
+            if 'Settings' in config and config['Settings'].get('missed_policy') in Scheduler.POLICIES:
+                self.clock.scheduler.policy = config['Settings']['missed_policy']
             
             QMessageBox.information(self, "读取成功", "已成功从config.json文件读取配置！")
         except Exception as e:
@@ -10,7 +10,7 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=['tkinter', 'unittest', 'sqlite3'],
+    excludes=['tkinter', 'unittest'],
     noarchive=False,
     optimize=1,
 )
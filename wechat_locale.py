@@ -24,6 +24,9 @@ class WeChatLocale:
         "group_chat":   {"en-US": "Group Chat",     "zh-CN": "群聊",            "zh-TW": "群聊"},
         "manage_contacts":  {"en-US": "Manage Contacts", "zh-CN": "通讯录管理", "zh-TW": "通訊錄管理"},
 
+        "sessions":     {"en-US": "会话",           "zh-CN": "会话",            "zh-TW": "会话"},
+        "search_result":    {"en-US": "@str:IDS_FAV_SEARCH_RESULT:3780", "zh-CN": "@str:IDS_FAV_SEARCH_RESULT:3780",
+                             "zh-TW": "@str:IDS_FAV_SEARCH_RESULT:3780"},
         "message":      {"en-US": "消息",           "zh-CN": "消息",            "zh-TW": "消息"},
         "chat_history": {"en-US": "Chat History",   "zh-CN": "聊天记录",        "zh-TW": "聊天記錄"},
         "photos_n_videos":  {"en-US": "Photos & Videos", "zh-CN": "图片与视频", "zh-TW": "圖片與影片"},
@@ -0,0 +1,65 @@
+"""
+常用控件的定位缓存。
+每次都从桌面根控件重新搜索搜索框、发送按钮等控件需要多次跨进程调用，在大量发送时占用了相当一部分时间。
+这里把找到的控件按语言键缓存起来，并以微信主窗口句柄为根。再次使用时只做廉价的校验（窗口句柄是否仍然有效、
+控件位置是否变化），校验失败才重新搜索。
+"""
+
+
+class LocatorCache:
+    def __init__(self, backend):
+        self.backend = backend
+        # 语言键 -> (窗口句柄, 控件名称, 控件, 控件位置)
+        self.entries = {}
+        # 命中与未命中的次数，用于统计缓存效果
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _bounds(control):
+        # 控件失效时读取位置可能抛出异常，此时视为未命中
+        try:
+            rect = control.BoundingRectangle
+            return rect.left, rect.top, rect.right, rect.bottom
+        except Exception:
+            return None
+
+    def get(self, key, window, control_type, name=None, depth=None, exists_timeout=None):
+        """
+        获取以 window 为根的控件，优先使用缓存
+        Args:
+            key: 缓存的键，一般为 WeChatLocale 中的语言键
+            window: 搜索的根窗口
+            control_type: 控件类型，如 "EditControl"
+            name: 控件名称，为空时不按名称搜索
+            depth: 控件相对于 window 的深度，为空时搜索全部后代
+            exists_timeout: 重新搜索时最多等待控件出现的时间，超时抛出 LookupError。为空时使用 uiautomation 默认的搜索等待
+        """
+        handle = window.NativeWindowHandle
+        entry = self.entries.get(key)
+        if entry is not None:
+            cached_handle, cached_name, control, bounds = entry
+            if (cached_handle == handle and cached_name == name and self.backend.is_window(handle)
+                    and bounds is not None and self._bounds(control) == bounds):
+                self.hits += 1
+                return control
+
+        self.misses += 1
+        properties = {}
+        if name is not None:
+            properties["Name"] = name
+        if depth is not None:
+            properties["Depth"] = depth
+        control = getattr(window, control_type)(**properties)
+        if exists_timeout is not None and not control.Exists(exists_timeout, 0):
+            self.entries.pop(key, None)
+            raise LookupError(f"控件不存在: {key}")
+        self.entries[key] = (handle, name, control, self._bounds(control))
+        return control
+
+    def invalidate(self, key=None):
+        """清除指定键的缓存，key 为空时清除全部缓存"""
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
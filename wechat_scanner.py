@@ -0,0 +1,231 @@
+"""
+虚拟化列表的滚动扫描。
+通讯录管理界面等列表只为可见的行创建控件，需要滚动才能读到全部内容。原来的做法是在固定的 1001 个（或 101 个）
+滚动位置逐一读取全部可见行，联系人很少时做了大量无用功，联系人很多时相邻两个位置之间又可能跳过若干行。
+
+scan_list 根据 ScrollPattern 的可见区域占比计算一页对应的滚动百分比，每次向下滚动一页（保留 overlap 行重叠），
+并用行的标识检查新的一页是否与上一页首尾相接：接不上说明跳过了行，此时缩小步长重新滚动。滚动到底后立即结束，
+因此读取的次数与列表的行数成正比，且不会漏行。
+
+scan_list_upward 用于聊天记录这样从底部往上翻、翻到顶部还需要点击“查看更多消息”的列表，从下往上逐页产生各行。
+聊天记录中经常有连续相同的消息（如多条“好的”），只比较内容时重叠的位置可能不唯一，
+因此还根据滚动的百分比估算各行应该移动的像素，选择位移最接近的对齐位置。
+
+只有一行可见时相邻两页无法重叠，此时每次只滚动一行，并根据滚动后实际的百分比（即实际移动的像素）
+确认正好移动了一行，而不是比较行的内容。
+"""
+
+
+def _continue_index(prev, cur):
+    """
+    检查 cur 的开头是否与 prev 的结尾重叠
+    Args:
+        prev: 上一页各行的标识
+        cur: 当前页各行的标识
+    Return:
+        当前页中第一个新行的下标，不重叠时返回None
+    """
+    if not cur:
+        return None
+    for p in range(len(prev)):
+        # 优先选择重叠最多的位置
+        m = len(prev) - p
+        if prev[p:] == cur[:m]:
+            return m
+    return None
+
+
+def _row_percent(view, visible):
+    # 可见区域占比为 view、可见 visible 行时，滚动一行对应的百分比：最大滚动距离为 visible * (100 / view - 1) 行
+    return view / max(100 - view, 1e-6) * 100 / max(visible, 1)
+
+
+def _rows_moved(scroll_pattern, percent, row):
+    # 根据滚动后实际的百分比计算移动了多少行
+    return round(abs(scroll_pattern.VerticalScrollPercent - percent) / row)
+
+
+def scan_list(list_control, key, overlap=2, max_retries=6, read_children=None):
+    """
+    按顺序逐页读取列表中的全部行
+    Args:
+        list_control: 列表控件
+        key: 从行控件读取该行标识（同时也是返回的数据）的函数
+        overlap: 相邻两页之间保留的重叠行数
+        max_retries: 两页接不上时最多缩小步长的次数
+        read_children: 无参数的函数，返回当前可见的行，为空时使用 list_control.GetChildren。
+            传入读取快照的函数（见 WeChatBackend.snapshot）可以一次取得整页的内容
+    Return:
+        生成器，按列表顺序依次产生每一行的 key(row)。重叠部分不会重复产生
+    """
+    if read_children is None:
+        read_children = list_control.GetChildren
+
+    def read():
+        return [key(row) for row in read_children()]
+
+    scroll_pattern = list_control.GetScrollPattern()
+    if scroll_pattern is None or not scroll_pattern.VerticallyScrollable:
+        yield from read()
+        return
+
+    percent = 0
+    scroll_pattern.SetScrollPercent(-1, percent)
+    prev = read()
+    yield from prev
+
+    while percent < 100 and prev:
+        view = scroll_pattern.VerticalViewSize
+        visible = len(prev)
+        if visible < 2:
+            # 只有一行可见，无法用重叠的行对齐：每次滚动一行，实际没有移动时说明已经到底
+            row = _row_percent(view, visible)
+            scroll_pattern.SetScrollPercent(-1, min(100, percent + row))
+            if _rows_moved(scroll_pattern, percent, row) < 1:
+                return
+            percent = scroll_pattern.VerticalScrollPercent
+            prev = read()
+            yield from prev
+            continue
+
+        # 可见区域占比为 view 时，滚动一整页对应的百分比为 view / (100 - view) * 100
+        keep = min(overlap, visible - 1)
+        step = _row_percent(view, visible) * (visible - keep)
+
+        for _ in range(max_retries + 1):
+            target = min(100, percent + step)
+            scroll_pattern.SetScrollPercent(-1, target)
+            cur = read()
+            start = _continue_index(prev, cur)
+            if start is not None:
+                break
+            # 与上一页接不上，说明跳过了部分行，缩小步长重试
+            step /= 2
+        else:
+            # 始终接不上时（如列表内容在扫描过程中发生变化），把当前页全部视为新行
+            start = 0
+
+        yield from cur[start:]
+        percent = target
+        prev = cur
+
+
+def _row_top(row):
+    # 行的上边缘位置，无法获取时返回None
+    try:
+        return row.BoundingRectangle.top
+    except (AttributeError, LookupError):
+        return None
+
+
+def _align_upward(cur, prev, expected=None):
+    """
+    检查较早的一页 cur 的结尾是否与 prev 的开头重叠
+    Args:
+        cur: 向上滚动后读到的一页，元素为 (行的标识, 上边缘位置)，按从上到下的顺序
+        prev: 上一页
+        expected: 预计各行向下移动的像素，为空时选择重叠最多的位置
+    Return:
+        重叠的行数，不重叠时返回None
+    """
+    if not prev:
+        return 0
+    first = prev[0][0]
+    best = None
+    # 从重叠最多的位置开始检查
+    for j in range(max(0, len(cur) - len(prev)), len(cur)):
+        if cur[j][0] != first:
+            continue
+        m = len(cur) - j
+        if any(cur[j + i][0] != prev[i][0] for i in range(1, m)):
+            continue
+        if expected is None or cur[j][1] is None or prev[0][1] is None:
+            return m
+        # 内容相同的多个对齐位置中，选择实际位移最接近预计位移的
+        error = abs(cur[j][1] - prev[0][1] - expected)
+        if best is None or error < best[0]:
+            best = (error, m)
+    return best[1] if best is not None else None
+
+
+def scan_list_upward(list_control, key, is_more, load_more, read_children=None, overlap=2, max_retries=6):
+    """
+    从列表底部开始，逐页向上读取列表中的全部行，翻到顶部后点击“查看更多消息”继续读取
+    Args:
+        list_control: 列表控件
+        key: 从行控件读取该行标识（同时也是返回的数据）的函数
+        is_more: 判断行控件是否为“查看更多消息”的函数
+        load_more: 无参数的函数，点击“查看更多消息”
+        read_children: 无参数的函数，返回当前可见的行，为空时使用 list_control.GetChildren
+        overlap: 相邻两页之间保留的重叠行数
+        max_retries: 两页接不上时最多缩小步长的次数
+    Return:
+        生成器，从最后一行开始往前依次产生每一行的 key(row)。只在需要下一行时才滚动，内存中只保留一页
+    """
+    if read_children is None:
+        read_children = list_control.GetChildren
+
+    def read():
+        rows = read_children()
+        more = bool(rows) and is_more(rows[0])
+        if more:
+            rows = rows[1:]
+        return [(key(row), _row_top(row)) for row in rows], more
+
+    scroll_pattern = list_control.GetScrollPattern()
+    if scroll_pattern is not None and scroll_pattern.VerticallyScrollable:
+        scroll_pattern.SetScrollPercent(-1, 100)
+    rect = getattr(list_control, "BoundingRectangle", None)
+    height = rect.bottom - rect.top if rect is not None else None
+
+    prev, more = read()
+    for row_key, _ in reversed(prev):
+        yield row_key
+
+    idle = 0
+    while True:
+        scrollable = scroll_pattern is not None and scroll_pattern.VerticallyScrollable
+        percent = scroll_pattern.VerticalScrollPercent if scrollable else 0
+        if percent > 0 and len(prev) < 2:
+            # 只有一行可见，每次向上滚动一行，参见 scan_list。实际没有移动时本页没有新的行
+            row = _row_percent(scroll_pattern.VerticalViewSize, len(prev))
+            scroll_pattern.SetScrollPercent(-1, max(0, percent - row))
+            moved = _rows_moved(scroll_pattern, percent, row)
+            cur, more = read()
+            m = 0 if moved >= 1 else len(cur)
+        elif percent > 0:
+            # 向上滚动一页，保留 overlap 行重叠，参见 scan_list
+            view = scroll_pattern.VerticalViewSize
+            visible = len(prev)
+            keep = min(overlap, visible - 1)
+            step = _row_percent(view, visible) * (visible - keep)
+            for _ in range(max_retries + 1):
+                target = max(0, percent - step)
+                scroll_pattern.SetScrollPercent(-1, target)
+                cur, more = read()
+                # 滚动的像素 = 滚动的百分比 * (内容高度 - 可见高度)，内容高度 = 可见高度 / 可见区域占比
+                expected = (percent - target) / 100 * height * (100 / view - 1) if height else None
+                m = _align_upward(cur, prev, expected)
+                if m is not None:
+                    break
+                step /= 2
+            else:
+                m = 0
+        elif more:
+            # 已经在顶部，加载更早的行。新的行出现在已读行的上方
+            load_more()
+            cur, more = read()
+            m = _align_upward(cur, prev)
+            if m is None:
+                m = 0
+        else:
+            return
+
+        new = cur[:len(cur) - m]
+        for row_key, _ in reversed(new):
+            yield row_key
+        prev = cur
+        # 连续几次都没有读到新的行（如列表无法滚动），停止读取
+        idle = 0 if new else idle + 1
+        if idle >= 3:
+            return
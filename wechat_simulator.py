@@ -0,0 +1,947 @@
+"""
+内存中的模拟微信，实现了 WeChatBackend 接口，用于在没有 Windows 桌面的环境（如 Linux CI）下运行和测量 WeChat 的各个流程。
+
+模拟的控件树尽量还原真实微信的结构和深度（见 ui_auto_wechat.py 中的控件介绍），包括：
+    主窗口：聊天/通讯录按钮、搜索框、会话列表、聊天界面（标题、消息列表、输入框、发送按钮、聊天记录按钮）
+    通讯录管理窗口：联系人/最近群聊列表（虚拟化列表，只生成可见的行）
+    聊天记录窗口：图片与视频列表以及右键菜单
+所有等待都使用虚拟时钟，不会真正阻塞。
+
+用法示例：
+    sim = SimulatedWeChat()
+    sim.add_contact("张三", note="老张", tag="同事")
+    wechat = WeChat(None, backend=sim)
+    wechat.send_msg("张三", "你好")
+    print(sim.chats["张三"].messages)
+"""
+import os
+import re
+import collections
+
+from wechat_backend import WeChatBackend
+from wechat_locale import WeChatLocale
+
+
+class SimRect:
+    """与 uiautomation.Rect 接口一致的矩形"""
+    def __init__(self, left=0, top=0, right=0, bottom=0):
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+
+    def width(self):
+        return self.right - self.left
+
+    def height(self):
+        return self.bottom - self.top
+
+    def xcenter(self):
+        return self.left + self.width() // 2
+
+    def ycenter(self):
+        return self.top + self.height() // 2
+
+    def __eq__(self, other):
+        return (isinstance(other, SimRect) and
+                (self.left, self.top, self.right, self.bottom) == (other.left, other.top, other.right, other.bottom))
+
+    def __hash__(self):
+        return hash((self.left, self.top, self.right, self.bottom))
+
+    def __repr__(self):
+        return f"SimRect({self.left}, {self.top}, {self.right}, {self.bottom})"
+
+
+class SimScrollPattern:
+    """模拟 ScrollPattern，百分比取值范围与 UIA 一致（0~100，-1 表示不滚动）"""
+    NoScrollValue = -1
+
+    def __init__(self, get_state, set_percent):
+        # get_state() 返回 (当前百分比, 可见区域占比百分比)
+        self._get_state = get_state
+        self._set_percent = set_percent
+
+    @property
+    def VerticalScrollPercent(self):
+        return self._get_state()[0]
+
+    @property
+    def VerticalViewSize(self):
+        return self._get_state()[1]
+
+    @property
+    def VerticallyScrollable(self):
+        return self._get_state()[1] < 100
+
+    def SetScrollPercent(self, horizontalPercent, verticalPercent, waitTime=None):
+        if verticalPercent != SimScrollPattern.NoScrollValue:
+            self._set_percent(min(max(verticalPercent, 0), 100))
+        return True
+
+
+class SimValuePattern:
+    """模拟 ValuePattern。is_read_only 为返回控件是否只读的函数，只读时 SetValue 会失败"""
+    def __init__(self, get_value, set_value, is_read_only=None):
+        self._get_value = get_value
+        self._set_value = set_value
+        self._is_read_only = is_read_only
+
+    @property
+    def Value(self):
+        return self._get_value()
+
+    @property
+    def IsReadOnly(self):
+        return self._is_read_only is not None and self._is_read_only()
+
+    def SetValue(self, value, waitTime=None):
+        if self.IsReadOnly:
+            raise RuntimeError("ValuePattern is read only")
+        self._set_value(value)
+        return True
+
+
+class SimControl:
+    """
+    模拟的控件，提供 uiautomation.Control 常用的属性与搜索方法。
+    children 为静态子控件；provider 为返回子控件列表的函数，用于模拟每次枚举都会重新生成的虚拟化列表。
+    alive 为返回控件当前是否仍在界面上的函数，控件不在界面上时读取位置会像真实的 UIA 元素一样失败。
+    """
+    def __init__(self, control_type, name="", children=None, provider=None, class_name="", handle=0,
+                 rect=None, role=None, on_click=None, on_right_click=None, on_double_click=None,
+                 scroll_pattern=None, value_pattern=None, alive=None):
+        self.ControlTypeName = control_type
+        self.Name = name
+        self.ClassName = class_name
+        self.AutomationId = ""
+        self.NativeWindowHandle = handle
+        self.role = role
+        self.on_click = on_click
+        self.on_right_click = on_right_click
+        self.on_double_click = on_double_click
+        self._rect = rect
+        self._scroll_pattern = scroll_pattern
+        self._value_pattern = value_pattern
+        self._provider = provider
+        self._alive = alive
+        self._parent = None
+        self._children = []
+        for child in children or []:
+            self.add(child)
+
+    def add(self, child):
+        child._parent = self
+        self._children.append(child)
+        return child
+
+    @property
+    def BoundingRectangle(self):
+        if self._alive is not None and not self._alive():
+            raise LookupError("Element not available")
+        # 没有指定位置的控件（大多是布局用的Pane）沿用父控件的位置
+        if self._rect is None:
+            return self._parent.BoundingRectangle if self._parent else SimRect()
+        return self._rect
+
+    def GetPosition(self):
+        rect = self.BoundingRectangle
+        return rect.xcenter(), rect.ycenter()
+
+    def GetParentControl(self):
+        return self._parent
+
+    def GetChildren(self):
+        if self._provider is None:
+            return list(self._children)
+        children = self._provider()
+        for child in children:
+            child._parent = self
+        return children
+
+    def GetFirstChildControl(self):
+        children = self.GetChildren()
+        return children[0] if children else None
+
+    def GetLastChildControl(self):
+        children = self.GetChildren()
+        return children[-1] if children else None
+
+    def GetScrollPattern(self):
+        return self._scroll_pattern
+
+    def GetValuePattern(self):
+        return self._value_pattern
+
+    def Exists(self, maxSearchSeconds=0, searchIntervalSeconds=0):
+        return True
+
+    def _walk(self, max_depth, depth=0):
+        # 深度优先遍历后代控件，返回(控件, 相对深度)
+        if depth >= max_depth:
+            return
+        for child in self.GetChildren():
+            yield child, depth + 1
+            yield from child._walk(max_depth, depth + 1)
+
+    def _match(self, control_type, properties):
+        if control_type is not None and self.ControlTypeName != control_type:
+            return False
+        for key, value in properties.items():
+            if key == "SubName":
+                if value not in self.Name:
+                    return False
+            elif getattr(self, key, None) != value:
+                return False
+        return True
+
+    def Control(self, control_type=None, Depth=None, searchDepth=None, foundIndex=1, **properties):
+        """
+        按 uiautomation 的规则搜索后代控件：Depth 为精确的相对深度，searchDepth 为最大搜索深度，
+        foundIndex 为深度优先顺序下第几个符合条件的控件。找不到时抛出 LookupError。
+        """
+        properties.pop("searchInterval", None)
+        if Depth is not None:
+            max_depth = Depth
+        elif searchDepth is not None:
+            max_depth = searchDepth
+        else:
+            max_depth = float("inf")
+
+        cnt = 0
+        for control, depth in self._walk(max_depth):
+            if Depth is not None and depth != Depth:
+                continue
+            if control._match(control_type, properties):
+                cnt += 1
+                if cnt == foundIndex:
+                    return control
+        raise LookupError(f"Find Control Timeout: {control_type} {properties}")
+
+    def __repr__(self):
+        return f"<{self.ControlTypeName} Name={self.Name!r}>"
+
+
+# 为 SimControl 生成 ButtonControl()、ListControl() 等按类型搜索的方法
+def _make_search(control_type):
+    def search(self, **kwargs):
+        return self.Control(control_type, **kwargs)
+    return search
+
+
+for _type in ("Button", "Edit", "List", "ListItem", "Pane", "Text", "Window", "TabItem", "MenuItem",
+              "ToolBar", "Image", "Group"):
+    setattr(SimControl, f"{_type}Control", _make_search(f"{_type}Control"))
+
+
+def _nest(depth, leaf):
+    """
+    在 leaf 外面包裹 depth 层 PaneControl，用来还原真实微信中控件的深度
+    """
+    for _ in range(depth):
+        leaf = SimControl("PaneControl", children=[leaf])
+    return leaf
+
+
+class SimChat:
+    """
+    一个模拟的聊天窗口
+    messages: 列表，元素为(类型, 发送人, 内容)。类型为 "msg"（用户发送）、"time"（时间信息）或 "system"（红包、撤回等系统消息）
+    pictures: 列表，元素为(文件路径, 类型)，类型为 "image"、"video" 或 "cleaned"（已被清理的图片），从旧到新排列
+    """
+    def __init__(self, name, is_group=False):
+        self.name = name
+        self.is_group = is_group
+        self.messages = []
+        self.pictures = []
+        self.unread = 0
+        # 聊天界面当前已加载的消息数量，点击“查看更多消息”会增加
+        self.loaded = 0
+        # 虚拟化的消息列表中，可见区域底部与最后一条消息之间的行数（0 表示滚动到底部）
+        self.view_offset = 0
+        # 最后一条消息的时间（虚拟时钟）
+        self.active = 0.0
+
+
+class SimulatedWeChat(WeChatBackend):
+    # 主窗口的窗口类名，与真实微信一致
+    MAIN_CLASS = "WeChatMainWndForPC"
+
+    def __init__(self, locale="zh-CN", self_name="我", running=True, page_size=30, rows_per_page=12,
+                 latency=0.0, value_pattern_settable=True, message_viewport=0):
+        """
+        Args:
+            locale: 模拟的微信语言
+            self_name: 当前登录用户的昵称，自己发送的消息以此为发送人
+            running: 微信是否已经启动
+            page_size: 打开聊天时加载的消息数量，以及每次点击“查看更多消息”增加的数量
+            rows_per_page: 会话列表、通讯录管理列表、图片列表可见的行数
+            latency: 界面响应的延迟（虚拟时间，秒）。粘贴、搜索、打开聊天和发送在延迟之后才会生效
+            value_pattern_settable: 搜索框和输入框是否支持通过 ValuePattern 直接设置文本
+            message_viewport: 消息列表可见的行数。大于0时消息列表是虚拟化的，只有可见的消息才有控件，需要滚动才能读到其他消息；
+                为0时所有已加载的消息都有控件
+        """
+        self.lc = WeChatLocale(locale)
+        self.self_name = self_name
+        self.page_size = page_size
+        self.rows_per_page = rows_per_page
+        self.message_viewport = message_viewport
+
+        # 虚拟时钟（秒）以及各种操作的计数
+        self.clock = 0.0
+        self.stats = collections.Counter()
+        # 等待生效的界面响应：(生效时间, 函数)
+        self.latency = latency
+        self._pending = []
+        self.value_pattern_settable = value_pattern_settable
+
+        self.chats = {}
+        # 会话列表，按最近活跃排序
+        self.sessions = []
+        # 通讯录：(昵称, 备注, 标签)
+        self.contacts = []
+        self.groups = []
+
+        # 订阅了控件变化事件的回调：(控件, 回调函数)
+        self._change_callbacks = []
+
+        self.clipboard = None
+        self.focus = None
+        self.tab = "chats"
+        self.current_chat = None
+        self.search_text = ""
+        self.input_text = ""
+        self.input_files = []
+        self._mention_start = None
+        self._mention_all = False
+
+        self.session_offset = 0
+        self.manage_offset = 0
+        self.manage_groups = False
+        self.picture_offset = 0
+        self.picture_tab = False
+
+        self._next_handle = 0x10010
+        self.running = running
+        self.main_window = self._build_main_window() if running else None
+        # 所有打开的顶层窗口，最后一个为前台窗口
+        self.windows = [self.main_window] if running else []
+        self.root = SimControl("PaneControl", name="桌面 1", provider=lambda: self.windows[::-1],
+                               rect=SimRect(0, 0, 1920, 1080))
+
+    # ---------------------------------------------------------------------------
+    # 构造模拟数据
+    # ---------------------------------------------------------------------------
+    def add_chat(self, name, is_group=False):
+        if name not in self.chats:
+            self.chats[name] = SimChat(name, is_group)
+            self.sessions.append(name)
+        return self.chats[name]
+
+    def add_contact(self, name, note="", tag=""):
+        self.contacts.append((name, note, tag))
+        return self.add_chat(name)
+
+    def add_group(self, name):
+        self.groups.append(name)
+        return self.add_chat(name, is_group=True)
+
+    def add_time(self, chat, text):
+        self.add_chat(chat).messages.append(("time", "", text))
+
+    def add_system(self, chat, text):
+        self.add_chat(chat).messages.append(("system", "", text))
+
+    def receive(self, chat, content, sender=None):
+        """
+        模拟收到一条新消息。如果聊天不在前台则增加未读计数，并将会话移到列表顶部
+        """
+        c = self.add_chat(chat)
+        c.messages.append(("msg", sender or chat, content))
+        if not (self.current_chat == chat and self.windows and self.windows[-1] is self.main_window):
+            c.unread += 1
+        else:
+            c.loaded += 1
+        self._touch_session(chat)
+
+    def add_picture(self, chat, path, kind="image"):
+        self.add_chat(chat).pictures.append((path, kind))
+
+    def quit(self):
+        """模拟退出微信，主窗口及其句柄随之失效"""
+        self.running = False
+        self.windows = [window for window in self.windows if window is not self.main_window]
+        self.main_window = None
+        self.current_chat = None
+
+    def _later(self, func):
+        # 界面在 latency 之后才会响应
+        if self.latency <= 0:
+            func()
+        else:
+            self._pending.append((self.clock + self.latency, func))
+
+    def _run_pending(self):
+        while self._pending and self._pending[0][0] <= self.clock:
+            self._pending.pop(0)[1]()
+
+    def _touch_session(self, chat):
+        self.chats[chat].active = self.clock
+        self.sessions.remove(chat)
+        self.sessions.insert(0, chat)
+        self._notify_changes(self.session_list)
+
+    def _notify_changes(self, control):
+        for subscribed, callback in list(self._change_callbacks):
+            if subscribed is control:
+                callback()
+
+    def _new_handle(self):
+        self._next_handle += 0x10
+        return self._next_handle
+
+    # ---------------------------------------------------------------------------
+    # 控件树
+    # ---------------------------------------------------------------------------
+    def _build_main_window(self):
+        lc = self.lc
+        self.chats_button = SimControl("ButtonControl", lc.chats, rect=SimRect(0, 60, 60, 100),
+                                       on_click=self._click_chats, on_double_click=self._double_click_chats)
+        self.contacts_button = SimControl("ButtonControl", lc.contacts, rect=SimRect(0, 110, 60, 150),
+                                          on_click=self._click_contacts)
+        nav = SimControl("PaneControl", children=[
+            SimControl("ToolBarControl", lc.weixin, children=[self.chats_button, self.contacts_button]),
+        ])
+
+        self.search_box = SimControl("EditControl", lc.search, role="search", rect=SimRect(70, 20, 250, 50),
+                                     on_click=lambda: self._set_focus("search"),
+                                     value_pattern=SimValuePattern(lambda: self.search_text, self._set_search_text,
+                                                                   self._value_read_only))
+        search = _nest(6, self.search_box)
+
+        # 左侧列表：聊天页显示会话列表，通讯录页显示联系人列表
+        self.session_list = SimControl("ListControl", lc.sessions, provider=self._session_items,
+                                       rect=SimRect(60, 60, 310, 60 + 60 * self.rows_per_page),
+                                       alive=lambda: self.tab == "chats")
+        self.contact_list = SimControl(
+            "ListControl", lc.contact, rect=SimRect(60, 60, 310, 800), alive=lambda: self.tab == "contacts",
+            children=[SimControl("ButtonControl", lc.manage_contacts, rect=SimRect(70, 70, 300, 100),
+                                 on_click=self._open_manage_window)],
+            scroll_pattern=SimScrollPattern(lambda: (0, 100), lambda percent: None))
+        # 搜索框中有文本时，左侧列表上方显示搜索结果，第一个结果为回车时打开的聊天
+        self.search_result = SimControl("ListControl", lc.search_result, provider=self._search_result_items,
+                                        rect=SimRect(60, 60, 310, 560))
+        left_list = _nest(6, SimControl("PaneControl", provider=lambda: (
+            [self.session_list if self.tab == "chats" else self.contact_list]
+            + ([self.search_result] if self.search_text else []))))
+
+        # 右侧聊天界面，只有打开聊天时才存在。切换聊天时标题按钮保持不变，只更新名称
+        self.chat_title = SimControl("ButtonControl", rect=SimRect(330, 10, 600, 40), alive=self._chat_open)
+        self.send_button = SimControl("ButtonControl", lc.send, rect=SimRect(880, 740, 960, 770),
+                                      on_click=lambda: self._later(self._send), alive=self._chat_open)
+        self.message_list = SimControl("ListControl", lc.message, provider=self._message_items,
+                                       rect=SimRect(320, 60, 1000, 560), alive=self._chat_open,
+                                       scroll_pattern=SimScrollPattern(self._message_scroll_state, self._message_scroll))
+        chat_area = _nest(6, SimControl("PaneControl", provider=self._chat_area))
+
+        return SimControl("WindowControl", lc.weixin, class_name=self.MAIN_CLASS, handle=self._new_handle(),
+                          rect=SimRect(0, 0, 1000, 800), children=[nav, search, left_list, chat_area])
+
+    def _chat_open(self):
+        return self.current_chat is not None and self.tab == "chats"
+
+    def _chat_area(self):
+        if not self._chat_open():
+            return []
+        name = self.current_chat
+        history = SimControl("ButtonControl", self.lc.chat_history, rect=SimRect(600, 570, 630, 600),
+                             on_click=self._open_history_window)
+        input_box = SimControl("EditControl", name, role="input", rect=SimRect(320, 600, 1000, 730),
+                               on_click=lambda: self._set_focus("input"),
+                               value_pattern=SimValuePattern(self._input_value, self._set_input_text,
+                                                             self._value_read_only))
+        return [
+            _nest(5, self.chat_title),
+            _nest(3, self.message_list),
+            _nest(5, history),
+            _nest(4, input_box),
+            _nest(6, self.send_button),
+        ]
+
+    def _session_items(self):
+        items = []
+        visible = self.sessions[self.session_offset:self.session_offset + self.rows_per_page]
+        for row, name in enumerate(visible):
+            chat = self.chats[name]
+            last = chat.messages[-1][2] if chat.messages else ""
+            # 最后一条消息的时间，按虚拟时钟显示为 时:分
+            minutes = int(chat.active // 60)
+            active = f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+            top = 60 + 60 * row
+            children = [
+                SimControl("ButtonControl", name),
+                SimControl("PaneControl", children=[SimControl("TextControl", name), SimControl("TextControl", active),
+                                                    SimControl("TextControl", last)]),
+            ]
+            # 有未读消息时会多出一个显示未读数量的控件
+            if chat.unread:
+                children.append(SimControl("TextControl", str(chat.unread)))
+            items.append(SimControl("ListItemControl", name, rect=SimRect(60, top, 310, top + 60),
+                                    on_click=lambda name=name: self._later(lambda: self.open_chat(name)),
+                                    children=[SimControl("PaneControl", children=children)]))
+        return items
+
+    def _message_items(self):
+        chat = self.chats.get(self.current_chat)
+        if chat is None:
+            return []
+        start = max(0, len(chat.messages) - chat.loaded)
+        # 第 0 行为“查看更多消息”（有更多消息时），之后为已加载的消息
+        rows = [None] * (start > 0) + chat.messages[start:]
+        height = 40
+        if self.message_viewport and len(rows) > self.message_viewport:
+            # 虚拟化的列表只为可见的行创建控件，可见的行正好占满列表的高度
+            end = len(rows) - chat.view_offset
+            rows = rows[end - self.message_viewport:end]
+            height = 500 / self.message_viewport
+        items = [self._message_item("system", "", "查看更多消息", self._load_more) if row is None
+                 else self._message_item(*row) for row in rows]
+        bottom = 560
+        for item in items[::-1]:
+            item._rect = SimRect(320, bottom - height, 1000, bottom)
+            bottom -= height
+        return items
+
+    def _message_rows(self):
+        # 消息列表的总行数（包括“查看更多消息”）
+        chat = self.chats.get(self.current_chat)
+        if chat is None:
+            return 0
+        return chat.loaded + (1 if len(chat.messages) > chat.loaded else 0)
+
+    def _message_scroll_state(self):
+        n = self._message_rows()
+        if not self.message_viewport or n <= self.message_viewport:
+            return 100, 100
+        max_offset = n - self.message_viewport
+        chat = self.chats[self.current_chat]
+        return (max_offset - chat.view_offset) / max_offset * 100, self.message_viewport / n * 100
+
+    def _message_scroll(self, percent):
+        n = self._message_rows()
+        if not self.message_viewport or n <= self.message_viewport:
+            return
+        self.stats["scroll"] += 1
+        max_offset = n - self.message_viewport
+        self.chats[self.current_chat].view_offset = round((100 - percent) / 100 * max_offset)
+
+    @staticmethod
+    def _message_item(kind, sender, content, on_click=None):
+        # 时间信息的子控件是Text；用户消息的Pane里有头像按钮和内容；系统消息的Pane里只有空的Pane
+        if kind == "time":
+            children = [SimControl("TextControl", content)]
+        elif kind == "msg":
+            children = [SimControl("PaneControl", children=[
+                SimControl("ButtonControl", sender),
+                SimControl("PaneControl", children=[SimControl("TextControl", content)]),
+            ])]
+        else:
+            children = [SimControl("PaneControl", children=[SimControl("PaneControl")])]
+        return SimControl("ListItemControl", content, children=children, on_click=on_click)
+
+    def _build_manage_window(self):
+        rows = SimControl("ListControl", provider=self._manage_items, rect=SimRect(200, 140, 1100, 860),
+                          scroll_pattern=SimScrollPattern(self._manage_scroll_state, self._manage_scroll))
+        recent = SimControl("ButtonControl", "最近群聊", rect=SimRect(20, 200, 180, 230),
+                            on_click=self._show_manage_groups)
+        return SimControl("WindowControl", self.lc.manage_contacts, class_name="ContactManagerWindow",
+                          handle=self._new_handle(), rect=SimRect(100, 100, 1100, 900),
+                          children=[SimControl("PaneControl", children=[recent, rows])])
+
+    def _manage_rows(self):
+        return self.groups if self.manage_groups else self.contacts
+
+    def _manage_items(self):
+        rows = self._manage_rows()
+        items = []
+        for row, value in enumerate(rows[self.manage_offset:self.manage_offset + self.rows_per_page]):
+            top = 140 + 60 * row
+            if self.manage_groups:
+                children = [SimControl("ButtonControl"), SimControl("TextControl", value)]
+                name = value
+            else:
+                name, note, tag = value
+                children = [SimControl("ButtonControl"), SimControl("TextControl", name),
+                            SimControl("ButtonControl", note), SimControl("ButtonControl", tag)]
+            items.append(SimControl("ListItemControl", name, children=children,
+                                    rect=SimRect(200, top, 1100, top + 60)))
+        return items
+
+    def _manage_max_offset(self):
+        return max(0, len(self._manage_rows()) - self.rows_per_page)
+
+    def _manage_scroll_state(self):
+        n = len(self._manage_rows())
+        if n <= self.rows_per_page:
+            return 0, 100
+        return self.manage_offset / self._manage_max_offset() * 100, self.rows_per_page / n * 100
+
+    def _manage_scroll(self, percent):
+        self.stats["scroll"] += 1
+        self.manage_offset = round(percent / 100 * self._manage_max_offset())
+
+    def _build_history_window(self):
+        lc = self.lc
+        tab = SimControl("TabItemControl", lc.photos_n_videos, rect=SimRect(300, 100, 400, 130),
+                         on_click=self._show_pictures)
+        pictures = SimControl("ListControl", lc.photos_n_videos, provider=self._picture_items,
+                              rect=SimRect(200, 150, 900, 850))
+        return SimControl("WindowControl", self.current_chat, class_name="FileListMgrWnd",
+                          handle=self._new_handle(), rect=SimRect(200, 50, 900, 900),
+                          children=[_nest(3, SimControl("PaneControl", children=[tab, pictures]))])
+
+    def _picture_items(self):
+        chat = self.chats.get(self.current_chat)
+        if chat is None or not self.picture_tab:
+            return []
+        end = len(chat.pictures) - self.picture_offset
+        start = max(0, end - self.rows_per_page)
+        items = []
+        for row, (path, kind) in enumerate(chat.pictures[start:end]):
+            # 视频的子控件数量为3，图片为1
+            n = 3 if kind == "video" else 1
+            pane = SimControl("PaneControl", children=[SimControl("ImageControl") for _ in range(n)])
+            top = 150 + 60 * row
+            items.append(SimControl("ListItemControl", os.path.basename(path), children=[pane],
+                                    rect=SimRect(200, top, 900, top + 60),
+                                    on_right_click=lambda path=path, kind=kind: self._open_menu(path, kind)))
+        return items
+
+    def _open_menu(self, path, kind):
+        self._close_window("ContextMenu")
+        if kind == "cleaned":
+            first = SimControl("MenuItemControl", "删除")
+        else:
+            first = SimControl("MenuItemControl", self.lc.copy, rect=SimRect(500, 500, 600, 530),
+                               on_click=lambda: self._copy_picture(path))
+        menu = SimControl("WindowControl", class_name="ContextMenu", handle=self._new_handle(),
+                          children=[_nest(2, SimControl("ListControl", children=[first]))])
+        self.windows.append(menu)
+
+    def _copy_picture(self, path):
+        self.clipboard = [path]
+        self._close_window("ContextMenu")
+
+    def _open_paste_menu(self):
+        self._close_window("ContextMenu")
+        paste = SimControl("TextControl", "粘贴", rect=SimRect(500, 500, 600, 530), on_click=self._paste_from_menu)
+        menu = SimControl("WindowControl", class_name="ContextMenu", handle=self._new_handle(),
+                          children=[_nest(4, SimControl("PaneControl", children=[paste]))])
+        self.windows.append(menu)
+
+    def _paste_from_menu(self):
+        self._close_window("ContextMenu")
+        self._set_focus("input")
+        self._paste()
+
+    # ---------------------------------------------------------------------------
+    # 界面行为
+    # ---------------------------------------------------------------------------
+    def _find_window(self, class_name):
+        for window in self.windows:
+            if window.ClassName == class_name:
+                return window
+        return None
+
+    def _close_window(self, class_name):
+        window = self._find_window(class_name)
+        if window is not None:
+            self.windows.remove(window)
+
+    def _activate(self, window):
+        if window in self.windows:
+            self.windows.remove(window)
+            self.windows.append(window)
+
+    def _set_focus(self, role):
+        self.focus = role
+
+    def _value_read_only(self):
+        return not self.value_pattern_settable
+
+    def _set_search_text(self, text):
+        self.search_text = text
+
+    def _set_input_text(self, text):
+        self.input_text = text
+
+    def _input_value(self):
+        # 粘贴的文件在输入框中显示为一个占位字符
+        return self.input_text + "\ufffc" * len(self.input_files)
+
+    def _click_chats(self):
+        self.tab = "chats"
+
+    def _double_click_chats(self):
+        # 双击聊天按钮会把会话列表滚动到下一个有未读消息的会话
+        self.tab = "chats"
+        for i, name in enumerate(self.sessions):
+            if self.chats[name].unread:
+                self.session_offset = i
+                return
+
+    def _click_contacts(self):
+        self.tab = "contacts"
+
+    def _open_manage_window(self):
+        window = self._find_window("ContactManagerWindow")
+        if window is None:
+            window = self._build_manage_window()
+            self.windows.append(window)
+        self.manage_groups = False
+        self.manage_offset = 0
+        self._activate(window)
+
+    def _show_manage_groups(self):
+        self.manage_groups = True
+        self.manage_offset = 0
+
+    def _open_history_window(self):
+        self._close_window("FileListMgrWnd")
+        self.picture_offset = 0
+        self.picture_tab = False
+        self.windows.append(self._build_history_window())
+
+    def _show_pictures(self):
+        self.picture_tab = True
+
+    def open_chat(self, name):
+        """打开指定的聊天，相当于在会话列表中点击该会话"""
+        chat = self.add_chat(name)
+        self.stats["open_chat"] += 1
+        self.current_chat = name
+        self.chat_title.Name = name
+        self.tab = "chats"
+        if chat.unread:
+            chat.unread = 0
+            self._notify_changes(self.session_list)
+        chat.loaded = min(len(chat.messages), self.page_size)
+        chat.view_offset = 0
+        self.input_text = ""
+        self.input_files = []
+        self._mention_start = None
+        self.focus = "input"
+        self._activate(self.main_window)
+
+    def _load_more(self):
+        chat = self.chats[self.current_chat]
+        chat.loaded = min(len(chat.messages), chat.loaded + self.page_size)
+
+    def _search_results(self):
+        # 先精确匹配，再匹配名称或备注包含全部关键字（空格分隔）的聊天
+        text = self.search_text
+        if not text:
+            return []
+        notes = {name: note for name, note, _ in self.contacts}
+        words = text.split()
+        results = [text] if text in self.chats else []
+        for name in self.chats:
+            if name != text and words and (all(word in name for word in words)
+                                           or all(word in notes.get(name, "") for word in words)):
+                results.append(name)
+        return results
+
+    def _search_result_items(self):
+        return [SimControl("ListItemControl", name, rect=SimRect(60, 60 + 60 * row, 310, 120 + 60 * row))
+                for row, name in enumerate(self._search_results())]
+
+    def _search_enter(self):
+        results = self._search_results()
+        text, self.search_text = self.search_text, ""
+        if not text:
+            return
+        self.stats["search"] += 1
+        if results:
+            self.open_chat(results[0])
+
+    def _paste(self):
+        if self.clipboard is None:
+            return
+        if isinstance(self.clipboard, list):
+            if self.focus == "input":
+                self.input_files.extend(self.clipboard)
+        else:
+            self._type_text(self.clipboard)
+
+    def _type_text(self, text):
+        if self.focus == "search":
+            self.search_text += text
+        elif self.focus == "input":
+            if text == "@":
+                self._mention_start = len(self.input_text)
+                self._mention_all = False
+            self.input_text += text
+
+    def _enter(self):
+        if self.focus == "search":
+            self._search_enter()
+        elif self.focus == "input":
+            if self._mention_start is not None:
+                # 确认要@的人
+                target = "所有人" if self._mention_all else self.input_text[self._mention_start + 1:]
+                self.input_text = self.input_text[:self._mention_start] + f"@{target}\u2005"
+                self._mention_start = None
+            else:
+                self._send()
+
+    def _send(self):
+        chat = self.chats.get(self.current_chat)
+        if chat is None or not (self.input_text or self.input_files):
+            return
+        for path in self.input_files:
+            chat.messages.append(("msg", self.self_name, f"[文件]{os.path.basename(path)}"))
+            chat.loaded += 1
+        if self.input_text:
+            chat.messages.append(("msg", self.self_name, self.input_text))
+            chat.loaded += 1
+        self.stats["send"] += 1
+        self.input_text = ""
+        self.input_files = []
+        self._touch_session(chat.name)
+
+    def _window_of(self, control):
+        while control is not None and control.ControlTypeName != "WindowControl":
+            control = control.GetParentControl()
+        return control
+
+    # ---------------------------------------------------------------------------
+    # WeChatBackend 接口
+    # ---------------------------------------------------------------------------
+    def get_root(self):
+        return self.root
+
+    def get_foreground(self):
+        return self.windows[-1] if self.windows else self.root
+
+    def is_window(self, handle):
+        return any(window.NativeWindowHandle == handle for window in self.windows) if handle else False
+
+    def find_window(self, class_name):
+        window = self._find_window(class_name)
+        return window.NativeWindowHandle if window is not None else 0
+
+    def activate_window(self, handle):
+        self.stats["activate"] += 1
+        window = self.control_from_handle(handle)
+        if window is not None:
+            self._activate(window)
+
+    def control_from_handle(self, handle):
+        for window in self.windows:
+            if window.NativeWindowHandle == handle:
+                return window
+        return None
+
+    def launch(self, path):
+        self.stats["launch"] += 1
+        # 微信只允许运行一个实例，重复启动只会激活已有的窗口
+        if not self.running:
+            self.running = True
+            self.main_window = self._build_main_window()
+            self.windows.append(self.main_window)
+        self._activate(self.main_window)
+
+    def move(self, control):
+        self.stats["move"] += 1
+
+    def click(self, control):
+        self.stats["click"] += 1
+        window = self._window_of(control)
+        if window is not None and window.ClassName != "ContextMenu":
+            self._activate(window)
+        if control.on_click is not None:
+            control.on_click()
+
+    def right_click(self, control):
+        self.stats["click"] += 1
+        if control.on_right_click is not None:
+            control.on_right_click()
+
+    def right_click_at(self, x, y):
+        self.stats["click"] += 1
+        self._open_paste_menu()
+
+    def double_click(self, control):
+        self.stats["click"] += 2
+        if control.on_double_click is not None:
+            control.on_double_click()
+        elif control.on_click is not None:
+            control.on_click()
+
+    def send_keys(self, keys, control=None):
+        self.stats["send_keys"] += 1
+        if control is not None and control.role is not None:
+            self.focus = control.role
+        # 解析 uiautomation 的按键格式，如 "{Ctrl}v"、"{enter}"、"@{UP}"
+        modifier = None
+        for token in re.findall(r"\{[^}]+\}|.", keys, re.S):
+            key = token.lower()
+            if key in ("{ctrl}", "{alt}", "{shift}"):
+                modifier = key
+                continue
+            if modifier == "{ctrl}" and key == "v":
+                self._later(self._paste)
+            elif key == "{enter}":
+                self._later(self._enter)
+            elif key == "{up}":
+                if self._mention_start is not None:
+                    self._mention_all = True
+            elif not token.startswith("{"):
+                self._type_text(token)
+            modifier = None
+
+    def scroll(self, clicks):
+        # 图片列表每次向上滚动半页
+        if clicks > 0 and self._find_window("FileListMgrWnd") is not None:
+            chat = self.chats[self.current_chat]
+            max_offset = max(0, len(chat.pictures) - self.rows_per_page)
+            self.picture_offset = min(max_offset, self.picture_offset + self.rows_per_page // 2)
+
+    def get_value(self, control):
+        return control.GetValuePattern().Value
+
+    def set_value(self, control, text):
+        try:
+            control.GetValuePattern().SetValue(text)
+        except (AttributeError, RuntimeError):
+            return False
+        self.stats["set_value"] += 1
+        return True
+
+    def copy_text(self, text):
+        self.clipboard = text
+
+    def copy_files(self, paths):
+        self.clipboard = list(paths)
+
+    def get_clipboard_files(self):
+        return list(self.clipboard) if isinstance(self.clipboard, list) else None
+
+    def subscribe_changes(self, control, callback):
+        # 目前只有会话列表会产生变化事件
+        entry = (control, callback)
+        self._change_callbacks.append(entry)
+        return lambda: self._change_callbacks.remove(entry)
+
+    def snapshot(self, control):
+        # 记录批量读取的次数，便于比较逐个读取控件的次数
+        self.stats["snapshot"] += 1
+        return super().snapshot(control)
+
+    def sleep(self, seconds):
+        self.clock += seconds
+        self.stats["sleep"] += seconds
+        self._run_pending()
+
+    def now(self):
+        return self.clock
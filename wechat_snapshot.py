@@ -0,0 +1,96 @@
+"""
+控件子树的快照。
+解析聊天记录、通讯录等列表时需要读取每一行的若干子控件，每读取一次子控件或属性都是一次跨进程调用，行数多时非常慢。
+后端的 snapshot() 一次性取得整个子树的名称、类型、类名和位置（uiautomation 后端使用 UIA 的 CacheRequest），
+返回由 SnapshotNode 组成的只读树。SnapshotNode 提供与 uiautomation.Control 相同的读取和搜索方法，
+因此 _detect_type 等解析函数可以直接使用；但快照不能点击，点击仍需要使用真实的控件。
+"""
+import collections
+
+SnapshotRect = collections.namedtuple("SnapshotRect", ["left", "top", "right", "bottom"])
+
+
+class SnapshotNode:
+    __slots__ = ("Name", "ControlTypeName", "ClassName", "BoundingRectangle", "_children")
+
+    def __init__(self, name, control_type, class_name="", rect=None, children=()):
+        self.Name = name
+        self.ControlTypeName = control_type
+        self.ClassName = class_name
+        self.BoundingRectangle = rect
+        self._children = tuple(children)
+
+    def GetChildren(self):
+        return list(self._children)
+
+    def GetFirstChildControl(self):
+        return self._children[0] if self._children else None
+
+    def GetLastChildControl(self):
+        return self._children[-1] if self._children else None
+
+    def GetPosition(self):
+        rect = self.BoundingRectangle
+        return (rect.left + rect.right) // 2, (rect.top + rect.bottom) // 2
+
+    def Exists(self, maxSearchSeconds=0, searchIntervalSeconds=0):
+        return True
+
+    def _walk(self, max_depth, depth=0):
+        if depth >= max_depth:
+            return
+        for child in self._children:
+            yield child, depth + 1
+            yield from child._walk(max_depth, depth + 1)
+
+    def Control(self, control_type=None, Depth=None, searchDepth=None, foundIndex=1, **properties):
+        """
+        与 uiautomation 相同的后代搜索规则：Depth 为精确的相对深度，searchDepth 为最大搜索深度，
+        foundIndex 为深度优先顺序下第几个符合条件的控件。找不到时抛出 LookupError
+        """
+        properties.pop("searchInterval", None)
+        sub_name = properties.pop("SubName", None)
+        max_depth = Depth if Depth is not None else (searchDepth if searchDepth is not None else float("inf"))
+        cnt = 0
+        for node, depth in self._walk(max_depth):
+            if Depth is not None and depth != Depth:
+                continue
+            if control_type is not None and node.ControlTypeName != control_type:
+                continue
+            if sub_name is not None and sub_name not in node.Name:
+                continue
+            if any(getattr(node, key, None) != value for key, value in properties.items()):
+                continue
+            cnt += 1
+            if cnt == foundIndex:
+                return node
+        raise LookupError(f"快照中找不到控件: {control_type} {properties}")
+
+    def __getattr__(self, attr):
+        # ButtonControl()、PaneControl() 等按类型搜索的方法
+        if attr.endswith("Control"):
+            return lambda **kwargs: self.Control(attr, **kwargs)
+        raise AttributeError(attr)
+
+    def __repr__(self):
+        return f"<Snapshot {self.ControlTypeName} Name={self.Name!r}>"
+
+
+def build_snapshot(control, max_depth=None):
+    """
+    逐个读取控件的属性和子控件来建立快照，用于不支持批量读取的后端
+    Args:
+        control: 子树的根控件
+        max_depth: 最多读取的相对深度，为空时读取全部后代
+    """
+    def build(node, depth):
+        try:
+            rect = node.BoundingRectangle
+            rect = SnapshotRect(rect.left, rect.top, rect.right, rect.bottom)
+        except Exception:
+            rect = None
+        children = () if max_depth is not None and depth >= max_depth else \
+            [build(child, depth + 1) for child in node.GetChildren()]
+        return SnapshotNode(node.Name, node.ControlTypeName, node.ClassName, rect, children)
+
+    return build(control, 0)
@@ -0,0 +1,114 @@
+"""
+聊天记录中时间信息的解析。
+微信在消息之间插入的时间信息是相对于当前时间的文本，不同的语言版本格式也不同，如：
+    12:30                          今天
+    昨天 12:30 / Yesterday 12:30   昨天
+    星期一 09:10 / 週一 09:10 / Monday 09:10   一周以内
+    3月5日 12:30 / Mar 5 12:30     今年
+    2024年3月5日 12:30 / 2024/3/5 12:30 / Mar 5, 2024 12:30   更早
+时间可能带有 上午/下午 或 AM/PM。parse_time_separator 把这些文本换算成绝对时间，无法识别时返回None。
+"""
+import re
+import datetime
+
+MONTHS = {name: i + 1 for i, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"])}
+WEEKDAYS = {
+    "一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6,
+    "mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6,
+}
+RELATIVE_DAYS = {"今天": 0, "today": 0, "昨天": 1, "yesterday": 1, "前天": 2}
+# 下午、晚上以及 PM 的小时需要加 12
+AFTERNOON = {"下午", "晚上", "pm"}
+PERIODS = r"上午|下午|凌晨|早上|中午|晚上|am|pm"
+
+TIME_PATTERN = re.compile(rf"(?:({PERIODS})\s*)?(\d{{1,2}}):(\d{{2}})(?::\d{{2}})?(?:\s*({PERIODS}))?$")
+DATE_PATTERNS = [
+    # 2024年3月5日、3月5日
+    (re.compile(r"(?:(\d{4})年)?(\d{1,2})月(\d{1,2})日"), ("y", "m", "d")),
+    # 2024/3/5、2024-03-05、2024.3.5
+    (re.compile(r"(\d{4})[/.-](\d{1,2})[/.-](\d{1,2})"), ("y", "m", "d")),
+    # 3/5/2024、3/5/24（英文版本为 月/日/年）
+    (re.compile(r"(\d{1,2})/(\d{1,2})/(\d{2,4})"), ("m", "d", "y")),
+    # 3/5
+    (re.compile(r"(\d{1,2})/(\d{1,2})"), ("m", "d")),
+    # Mar 5, 2024、March 5
+    (re.compile(r"([a-z]{3})[a-z]*\.?\s+(\d{1,2})(?:,?\s+(\d{4}))?"), ("b", "d", "y")),
+    # 5 Mar 2024
+    (re.compile(r"(\d{1,2})\s+([a-z]{3})[a-z]*\.?(?:,?\s+(\d{4}))?"), ("d", "b", "y")),
+]
+WEEKDAY_PATTERN = re.compile(r"(?:星期|週|周|礼拜|禮拜)([一二三四五六日天])|(mon|tue|wed|thu|fri|sat|sun)[a-z]*")
+
+
+def _parse_date(text, today):
+    """
+    解析日期部分
+    Return:
+        date，无法识别时返回None
+    """
+    text = text.strip(" ,")
+    if not text:
+        return today
+    if text in RELATIVE_DAYS:
+        return today - datetime.timedelta(days=RELATIVE_DAYS[text])
+
+    match = WEEKDAY_PATTERN.fullmatch(text)
+    if match:
+        weekday = WEEKDAYS[match.group(1) or match.group(2)]
+        # 一周以内最近的这一天，与今天相同时为七天前
+        days = (today.weekday() - weekday) % 7 or 7
+        return today - datetime.timedelta(days=days)
+
+    for pattern, fields in DATE_PATTERNS:
+        match = pattern.fullmatch(text)
+        if match is None:
+            continue
+        values = dict(zip(fields, match.groups()))
+        if "b" in values:
+            if values["b"] not in MONTHS:
+                continue
+            values["m"] = MONTHS[values["b"]]
+        year = values.get("y")
+        try:
+            if year:
+                year = int(year)
+                return datetime.date(year + 2000 if year < 100 else year, int(values["m"]), int(values["d"]))
+            # 没有年份时为今年，晚于今天说明是去年
+            date = datetime.date(today.year, int(values["m"]), int(values["d"]))
+            return date if date <= today else date.replace(year=today.year - 1)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_time_separator(text, now=None):
+    """
+    把时间信息的文本换算成绝对时间
+    Args:
+        text: 时间信息控件的 Name，如 "昨天 12:30"
+        now: 当前时间（datetime），为空时使用本地的当前时间
+    Return:
+        datetime，无法识别时返回None
+    """
+    now = datetime.datetime.now() if now is None else now
+    text = " ".join(text.lower().split())
+
+    # 先从末尾取出时间，剩下的部分为日期
+    match = TIME_PATTERN.search(text)
+    hour, minute = 0, 0
+    if match:
+        before, hour, minute, after = match.groups()
+        hour, minute = int(hour), int(minute)
+        period = before or after
+        if period in AFTERNOON and hour < 12:
+            hour += 12
+        elif period in ("am", "凌晨") and hour == 12:
+            hour = 0
+        if hour > 23 or minute > 59:
+            return None
+        text = text[:match.start()]
+
+    date = _parse_date(text, now.date())
+    if date is None or (match is None and not text.strip()):
+        return None
+    return datetime.datetime.combine(date, datetime.time(hour, minute))
@@ -0,0 +1,141 @@
+"""
+基于 uiautomation 的真实桌面后端，只能在 Windows 上使用。
+"""
+import ctypes
+import subprocess
+import uiautomation as auto
+import pyperclip
+import pyautogui
+
+from PIL import ImageGrab
+from clipboard import setClipboardFiles
+from PyQt6.QtWidgets import QApplication
+
+from wechat_backend import WeChatBackend
+from wechat_snapshot import SnapshotNode, SnapshotRect
+
+
+class UIAutomationBackend(WeChatBackend):
+    def __init__(self):
+        # 用于复制内容到剪切板
+        self.app = QApplication.instance() or QApplication([])
+
+    def get_root(self):
+        return auto.GetRootControl()
+
+    def get_foreground(self):
+        return auto.GetForegroundControl()
+
+    def is_window(self, handle):
+        return bool(handle) and bool(ctypes.windll.user32.IsWindow(handle))
+
+    def find_window(self, class_name):
+        return ctypes.windll.user32.FindWindowW(class_name, None) or 0
+
+    def activate_window(self, handle):
+        user32 = ctypes.windll.user32
+        # 最小化时先还原，隐藏到托盘时先显示
+        if user32.IsIconic(handle):
+            user32.ShowWindow(handle, 9)  # SW_RESTORE
+        elif not user32.IsWindowVisible(handle):
+            user32.ShowWindow(handle, 5)  # SW_SHOW
+        user32.SetForegroundWindow(handle)
+
+    def control_from_handle(self, handle):
+        return auto.ControlFromHandle(handle)
+
+    def launch(self, path):
+        subprocess.Popen(path)
+
+    def move(self, control):
+        x, y = control.GetPosition()
+        auto.SetCursorPos(x, y)
+
+    # 鼠标快速点击控件
+    def click(self, control):
+        x, y = control.GetPosition()
+        auto.Click(x, y)
+
+    def right_click(self, control):
+        x, y = control.GetPosition()
+        auto.RightClick(x, y)
+
+    def right_click_at(self, x, y):
+        auto.RightClick(x, y)
+
+    # 鼠标快速点击两下控件
+    def double_click(self, control):
+        x, y = control.GetPosition()
+        auto.SetCursorPos(x, y)
+        control.DoubleClick()
+
+    def send_keys(self, keys, control=None):
+        if control is None:
+            auto.SendKeys(keys)
+        else:
+            control.SendKeys(keys)
+
+    def scroll(self, clicks):
+        pyautogui.scroll(clicks)
+
+    def get_value(self, control):
+        pattern = control.GetValuePattern()
+        if pattern is not None:
+            return pattern.Value
+        return control.GetLegacyIAccessiblePattern().Value
+
+    def set_value(self, control, text):
+        # 优先使用 ValuePattern，只读或不支持时尝试 LegacyIAccessiblePattern
+        try:
+            pattern = control.GetValuePattern()
+            if pattern is not None and not pattern.IsReadOnly:
+                pattern.SetValue(text)
+                return True
+            pattern = control.GetLegacyIAccessiblePattern()
+            if pattern is not None:
+                pattern.SetValue(text)
+                return True
+        except Exception:
+            pass
+        return False
+
+    def copy_text(self, text):
+        pyperclip.copy(text)
+
+    def copy_files(self, paths):
+        setClipboardFiles(paths)
+
+    def get_clipboard_files(self):
+        content = ImageGrab.grabclipboard()
+        # 剪切板中是文件时返回路径列表，是图片时返回Image对象
+        if isinstance(content, list):
+            return content
+        return None
+
+    def snapshot(self, control):
+        # 使用 UIA 的 CacheRequest，一次跨进程调用取得整个子树的属性，之后只读取缓存
+        uia = auto._AutomationClient.instance().IUIAutomation
+        request = uia.CreateCacheRequest()
+        for property_id in (auto.PropertyId.NameProperty, auto.PropertyId.ControlTypeProperty,
+                            auto.PropertyId.ClassNameProperty, auto.PropertyId.BoundingRectangleProperty):
+            request.AddProperty(property_id)
+        request.TreeScope = auto.TreeScope.Subtree
+        element = control.Element.BuildUpdatedCache(request)
+
+        def build(element):
+            rect = element.CachedBoundingRectangle
+            children = []
+            # 没有子控件时返回空指针
+            array = element.GetCachedChildren()
+            if array:
+                children = [build(array.GetElement(i)) for i in range(array.Length)]
+            return SnapshotNode(element.CachedName, auto.ControlTypeNames.get(element.CachedControlType, ""),
+                                element.CachedClassName, SnapshotRect(rect.left, rect.top, rect.right, rect.bottom),
+                                children)
+
+        return build(element)
+
+    def subscribe_changes(self, control, callback):
+        # uiautomation 库没有封装 UIA 的 StructureChanged/PropertyChanged 事件接口，这里不支持变化事件，
+        # SessionWatcher 等调用方会退回到定时读取
+        return None
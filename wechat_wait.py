@@ -0,0 +1,77 @@
+"""
+基于条件的等待。
+原来的发送流程在每一步之后固定 time.sleep 一段时间，界面响应快时白白等待，机器繁忙时又可能等得不够导致发错。
+Waiter 会按固定间隔轮询一个具体的界面条件（如聊天标题等于目标名称、输入框内容等于粘贴的文本），
+条件满足立即返回，超过期限则放弃，并记录每次等待实际花费的时间。
+"""
+import collections
+
+
+class WaitRecord:
+    def __init__(self, name, elapsed, ok):
+        # 等待的名称、实际等待的时间（秒）以及条件是否满足
+        self.name = name
+        self.elapsed = elapsed
+        self.ok = ok
+
+    def __repr__(self):
+        return f"WaitRecord({self.name!r}, {self.elapsed:.3f}, {self.ok})"
+
+
+class Waiter:
+    def __init__(self, backend, timeout=3.0, interval=0.05, max_records=1000):
+        """
+        Args:
+            backend: 自动化后端，用于获取时间和等待
+            timeout: 默认的最长等待时间（秒）
+            interval: 默认的轮询间隔（秒）
+            max_records: 最多保留的等待记录数量
+        """
+        self.backend = backend
+        self.timeout = timeout
+        self.interval = interval
+        self.records = collections.deque(maxlen=max_records)
+
+    def until(self, condition, name="", timeout=None, interval=None) -> bool:
+        """
+        轮询 condition 直到其返回真值或超时
+        Args:
+            condition: 无参数的函数，返回条件是否满足。抛出异常（如控件暂时不存在）视为不满足
+            name: 等待的名称，用于统计
+            timeout: 最长等待时间，为空时使用默认值
+            interval: 轮询间隔，为空时使用默认值
+        Return:
+            条件是否在期限内满足
+        """
+        timeout = self.timeout if timeout is None else timeout
+        interval = self.interval if interval is None else interval
+        start = self.backend.now()
+        while True:
+            try:
+                ok = bool(condition())
+            except Exception:
+                ok = False
+
+            elapsed = self.backend.now() - start
+            if ok or elapsed >= timeout:
+                break
+            self.backend.sleep(interval)
+
+        self.records.append(WaitRecord(name, elapsed, ok))
+        return ok
+
+    def summary(self):
+        """
+        按名称汇总等待记录
+        Return:
+            字典，名称 -> {"count": 次数, "total": 总时间, "max": 最长时间, "timeouts": 超时次数}
+        """
+        result = {}
+        for record in self.records:
+            stat = result.setdefault(record.name, {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0})
+            stat["count"] += 1
+            stat["total"] += record.elapsed
+            stat["max"] = max(stat["max"], record.elapsed)
+            if not record.ok:
+                stat["timeouts"] += 1
+        return result